@@ -0,0 +1,302 @@
+"""
+Offline бенчмарк входного конвейера обучения на CPU:
+annotation.json -> AnimeEpisodeCaptionDataset.__getitem__ -> ChatTemplateVLMCasualCollator -> батч тензоров.
+
+Классы набора данных и сборщика загружаются из ячеек тетрадки обучения, поэтому измеряется тот же код,
+что используется при обучении. Во временной директории создаётся синтетический набор данных
+(короткие видео ffmpeg и описания разной длины).
+
+Отчёт (JSON):
+    - распределение времени по этапам (декодирование видео, изменение размера и нормализация кадров,
+      шаблон чата, токенизация, прочее время набора данных и сборщика) - в одном процессе без потоков сборщика
+    - примеров/сек и батчей/сек для каждого количества процессов DataLoader
+    - пиковое потребление памяти (процесс и завершённые дочерние процессы)
+
+Пример запуска:
+    python notebooks/benchmark_input_pipeline.py --samples 32 --batch-size 2 --workers 0 1 2 4
+"""
+import argparse
+import functools
+import json
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+NOTEBOOK_PATH = ROOT / "train_vlm_for_anime_caption.ipynb"
+PIPELINE_CLASSES = ("AnimeData", "AnimeEpisodeCaptionDataset", "ChatTemplateVLMCasualCollator")
+STAGES = ("decode", "resize", "template", "tokenization", "dataset", "collate")
+
+_WORDS = (
+    "the hero travels across a ruined city with friends while a mysterious power awakens inside "
+    "school club rivals discover an ancient secret and fight to protect their home from demons"
+).split()
+
+
+def load_notebook_classes(notebook_path: Path, names: tuple[str, ...] = PIPELINE_CLASSES) -> types.ModuleType:
+    """
+    Загрузка классов и функций из тетрадки: выполняются ячейка импортов (первая ячейка кода) и ячейки с их определением.
+    Результат регистрируется как модуль, чтобы объекты передавались в процессы DataLoader.
+    """
+    with open(notebook_path, "r", encoding="utf-8") as f:
+        cells = [
+            "".join(cell["source"])
+            for cell in json.load(f)["cells"]
+            if cell["cell_type"] == "code"
+        ]
+    module = types.ModuleType("train_vlm_notebook")
+    sys.modules[module.__name__] = module
+    exec(cells[0], module.__dict__)
+    for source in cells[1:]:
+        if set(re.findall(r"^(?:class|def) (\w+)", source, flags=re.MULTILINE)) & set(names):
+            exec(source, module.__dict__)
+    if missing := [name for name in names if not hasattr(module, name)]:
+        raise ValueError(f"No found definitions {missing} in '{notebook_path}'")
+    return module
+
+
+def generate_dataset(
+        dataset_path: Path,
+        num_samples: int,
+        duration: float = 8.0,
+        resolution: str = "640x360",
+        frame_timestamps: int | None = None,
+        ffmpeg: str = "ffmpeg",
+        seed: int = 0,
+):
+    """
+    Генерация синтетического набора данных в формате модуля сбора данных.
+
+    Args:
+        dataset_path (Path): Директория набора данных
+        num_samples (int): Количество аниме
+        duration (float): Длительность видео в секундах
+        resolution (str): Разрешение видео
+        frame_timestamps (int | None): Количество сохраняемых в аннотации кадров (None - кадры выбирает обработчик)
+        ffmpeg (str): Путь до исполняемого файла ffmpeg
+        seed (int): Зерно генерации описаний
+    """
+    rng = random.Random(seed)
+    width, height = map(int, resolution.split("x"))
+    animes = []
+    for i in range(num_samples):
+        video_path = Path("videos", str(i), f"{i}.mp4")
+        (dataset_path / video_path).parent.mkdir(parents=True, exist_ok=True)
+        subprocess.run(
+            [
+                ffmpeg, "-y", "-loglevel", "error",
+                "-f", "lavfi", "-i", f"testsrc2=size={resolution}:rate=24",
+                "-t", str(duration),
+                "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+                str(dataset_path / video_path)
+            ],
+            check=True
+        )
+        anime = {
+            "id": str(i),
+            "mal_id": str(i),
+            "name": f"Anime {i}",
+            "title": f"Anime {i}",
+            "rating": "pg_13",
+            "score": round(rng.uniform(5, 9), 2),
+            "released": "2020-01-01 00:00:00",
+            "genres": rng.sample(["Action", "Comedy", "Drama", "Fantasy", "Romance"], k=2),
+            "main_characters": [f"Character {j}" for j in range(rng.randint(1, 4))],
+            "popularity": i,
+            # Описания разной длины (от короткого синопсиса до подробного)
+            "description": " ".join(rng.choices(_WORDS, k=rng.randint(20, 300))),
+            "video_path": video_path.as_posix(),
+            "video_resolution": [width, height],
+        }
+        if frame_timestamps:
+            anime["frame_timestamps"] = [
+                round((j + 0.5) * duration / frame_timestamps, 3) for j in range(frame_timestamps)
+            ]
+        animes.append(anime)
+    with open(dataset_path / "annotation.json", "w", encoding="utf-8") as f:
+        json.dump({"created_at": "2025-01-01 00:00:00", "animes": animes}, f, indent=4)
+
+
+class StageTimer:
+    """ Суммарное время этапов без времени вложенных этапов (по всем потокам) """
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def wrap(self, func, stage: str):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Стек времени вложенных этапов текущего потока
+            stack = self._local.__dict__.setdefault("stack", [])
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                with self._lock:
+                    self.seconds[stage] += elapsed - nested
+                    self.calls[stage] += 1
+        return wrapper
+
+    def report(self) -> dict[str, dict[str, float]]:
+        total = sum(self.seconds.values())
+        return {
+            stage: {
+                "seconds": self.seconds[stage],
+                "share": self.seconds[stage] / total if total else 0.0,
+                "calls": self.calls[stage],
+            }
+            for stage in STAGES
+        }
+
+
+def instrument(notebook: types.ModuleType, processor, timer: StageTimer):
+    """ Замена функций этапов конвейера на обёртки с замером времени """
+    from transformers import processing_utils
+
+    dataset_cls = notebook.AnimeEpisodeCaptionDataset
+    collator_cls = notebook.ChatTemplateVLMCasualCollator
+    # Декодирование: кадры по сохранённым меткам времени и видео, загружаемые обработчиком по пути
+    dataset_cls.load_video_frames = staticmethod(timer.wrap(dataset_cls.load_video_frames, "decode"))
+    processing_utils.load_video = timer.wrap(processing_utils.load_video, "decode")
+    processor.video_processor.preprocess = timer.wrap(processor.video_processor.preprocess, "resize")
+    processor.apply_chat_template = timer.wrap(processor.apply_chat_template, "template")
+    processor.tokenizer._call_one = timer.wrap(processor.tokenizer._call_one, "tokenization")
+    dataset_cls.__getitem__ = timer.wrap(dataset_cls.__getitem__, "dataset")
+    collator_cls.__call__ = timer.wrap(collator_cls.__call__, "collate")
+
+
+def _peak_rss_mb() -> dict[str, float]:
+    # ru_maxrss в Linux задаётся в килобайтах
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def measure_throughput(dataset, collator, batch_size: int, num_workers: int) -> dict[str, float]:
+    """ Скорость полного прохода по набору данных DataLoader-ом (включая запуск процессов) """
+    from torch.utils.data import DataLoader
+
+    loader = DataLoader(dataset, batch_size=batch_size, collate_fn=collator, num_workers=num_workers)
+    start = time.perf_counter()
+    num_batches = sum(1 for _ in loader)
+    elapsed = time.perf_counter() - start
+    return {
+        "num_workers": num_workers,
+        "elapsed": elapsed,
+        "samples_per_sec": len(dataset) / elapsed,
+        "batches_per_sec": num_batches / elapsed,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def run_benchmark(
+        dataset_path: Path,
+        model_id: str,
+        batch_size: int = 1,
+        workers: list[int] = (0,),
+        max_frames: int | None = None,
+        visual_token_budget: int | None = None,
+        thread_paralleling: bool = True,
+) -> dict:
+    from transformers import AutoProcessor
+
+    notebook = load_notebook_classes(NOTEBOOK_PATH)
+    processor = AutoProcessor.from_pretrained(model_id, use_fast=True)
+    if max_frames:
+        processor.video_processor.num_frames = max_frames
+    dataset = notebook.AnimeEpisodeCaptionDataset(dataset_path, video_max_size=processor.video_processor.size["longest_edge"])
+
+    # Распределение по этапам измеряется в одном процессе без потоков сборщика (иначе время этапов пересекается)
+    timer = StageTimer()
+    instrument(notebook, processor, timer)
+    stage_collator = notebook.ChatTemplateVLMCasualCollator(
+        processor=processor,
+        thread_paralleling=False,
+        visual_token_budget=visual_token_budget,
+    )
+    stage_run = measure_throughput(dataset, stage_collator, batch_size, num_workers=0)
+
+    collator = notebook.ChatTemplateVLMCasualCollator(
+        processor=processor,
+        thread_paralleling=thread_paralleling,
+        visual_token_budget=visual_token_budget,
+    )
+    return {
+        "samples": len(dataset),
+        "stages": timer.report(),
+        "stages_elapsed": stage_run["elapsed"],
+        "throughput": [
+            measure_throughput(dataset, collator, batch_size, num_workers)
+            for num_workers in workers
+        ],
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline CPU benchmark of the training input pipeline")
+    parser.add_argument("--samples", type=int, default=16, help="Number of synthetic samples")
+    parser.add_argument("--duration", type=float, default=8.0, help="Synthetic video duration in seconds")
+    parser.add_argument("--resolution", default="640x360", help="Synthetic video resolution")
+    parser.add_argument(
+        "--frame-timestamps", type=int, default=None,
+        help="Frames stored in annotation (default - processor samples frames)"
+    )
+    parser.add_argument("--model-id", default="HuggingFaceTB/SmolVLM2-500M-Video-Instruct", help="Processor model id")
+    parser.add_argument("--max-frames", type=int, default=32, help="Processor max frames")
+    parser.add_argument("--batch-size", type=int, default=1, help="Batch size")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4], help="DataLoader worker counts")
+    parser.add_argument("--visual-token-budget", type=int, default=None, help="Collator visual token budget")
+    parser.add_argument("--no-thread-paralleling", action="store_true", help="Disable collator threads")
+    parser.add_argument("--dataset-path", default=None, help="Existing dataset instead of synthetic one")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="Path to ffmpeg executable")
+    parser.add_argument("--output", default=None, help="Path to save JSON report (default - stdout)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        dataset_path = Path(args.dataset_path) if args.dataset_path else Path(work_dir, "dataset")
+        if not args.dataset_path:
+            generate_dataset(
+                dataset_path,
+                args.samples,
+                duration=args.duration,
+                resolution=args.resolution,
+                frame_timestamps=args.frame_timestamps,
+                ffmpeg=args.ffmpeg,
+            )
+        report = run_benchmark(
+            dataset_path,
+            args.model_id,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            max_frames=args.max_frames,
+            visual_token_budget=args.visual_token_budget,
+            thread_paralleling=not args.no_thread_paralleling,
+        )
+    report["params"] = vars(args)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=4), encoding="utf-8")
+    else:
+        json.dump(report, sys.stdout, indent=4)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+# Код тетрадки загружается через бенчмарк входного конвейера
+ROOT = Path(__file__).parents[1]
+sys.path.insert(0, str(ROOT))
+
+from benchmark_input_pipeline import NOTEBOOK_PATH, PIPELINE_CLASSES, generate_dataset, load_notebook_classes
+
+NOTEBOOK_DEFINITIONS = PIPELINE_CLASSES + ("VisionFeatureCache", "CachedFeatureDataset", "generate_captions")
+
+
+@pytest.fixture(scope="session")
+def notebook():
+    return load_notebook_classes(NOTEBOOK_PATH, NOTEBOOK_DEFINITIONS)
+
+
+@pytest.fixture(scope="session")
+def tiny_model_path(tmp_path_factory) -> Path:
+    """
+    Маленькая случайная модель SmolVLM для проверок на CPU: посимвольный токенизатор, кадры 32x32
+    и языковая модель из 2 слоёв
+    """
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers
+    from transformers import (
+        PreTrainedTokenizerFast,
+        SmolVLMConfig,
+        SmolVLMForConditionalGeneration,
+        SmolVLMImageProcessor,
+        SmolVLMProcessor,
+        SmolVLMVideoProcessor,
+    )
+
+    model_path = tmp_path_factory.mktemp("tiny_smolvlm")
+    special_tokens = [
+        "<pad>", "<unk>", "<|im_start|>", "<end_of_utterance>",
+        "<image>", "<fake_token_around_image>", "<global-img>", "<video>",
+    ]
+    chars = [chr(i) for i in range(32, 127)] + ["\n"]
+    vocab = {token: i for i, token in enumerate(special_tokens + chars)}
+    tokenizer = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Split(pattern="", behavior="isolated")
+    tokenizer.decoder = decoders.Fuse()
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        pad_token="<pad>",
+        unk_token="<unk>",
+        bos_token="<|im_start|>",
+        eos_token="<end_of_utterance>",
+        additional_special_tokens=special_tokens[4:],
+    )
+    chat_template = (
+        "<|im_start|>{% for message in messages %}{{ message['role'] | capitalize }}{{ ': ' }}"
+        "{% for line in message['content'] %}{% if line['type'] == 'text' %}{{ line['text'] }}"
+        "{% elif line['type'] == 'image' %}{{ '<image>' }}{% elif line['type'] == 'video' %}{{ '<video>' }}{% endif %}"
+        "{% endfor %}<end_of_utterance>\n{% endfor %}{% if add_generation_prompt %}{{ 'Assistant:' }}{% endif %}"
+    )
+    processor = SmolVLMProcessor(
+        image_processor=SmolVLMImageProcessor(
+            size={"longest_edge": 32},
+            max_image_size={"longest_edge": 32},
+            do_image_splitting=False,
+        ),
+        tokenizer=tokenizer,
+        video_processor=SmolVLMVideoProcessor(
+            video_sampling={"max_frames": 8, "fps": 1, "video_size": {"longest_edge": 32}},
+            max_image_size={"longest_edge": 32},
+        ),
+        image_seq_len=4,
+        chat_template=chat_template,
+    )
+    processor.save_pretrained(model_path)
+
+    config = SmolVLMConfig(
+        image_token_id=vocab["<image>"],
+        scale_factor=2,
+        vision_config={
+            "hidden_size": 32, "intermediate_size": 64, "num_hidden_layers": 1, "num_attention_heads": 2,
+            "image_size": 32, "patch_size": 8,
+        },
+        text_config={
+            "model_type": "llama", "vocab_size": len(vocab), "hidden_size": 32, "intermediate_size": 64,
+            "num_hidden_layers": 2, "num_attention_heads": 2, "num_key_value_heads": 2,
+            "max_position_embeddings": 4096, "pad_token_id": vocab["<pad>"],
+            "bos_token_id": vocab["<|im_start|>"], "eos_token_id": vocab["<end_of_utterance>"],
+        },
+    )
+    torch.manual_seed(0)
+    model = SmolVLMForConditionalGeneration(config)
+    model.generation_config.pad_token_id = vocab["<pad>"]
+    model.generation_config.eos_token_id = vocab["<end_of_utterance>"]
+    model.save_pretrained(model_path)
+    return model_path
+
+
+@pytest.fixture
+def dataset_path(tmp_path) -> Path:
+    """ Синтетический набор данных из 3 коротких видео с выбранными кадрами """
+    if shutil.which("ffmpeg") is None:
+        pytest.skip("ffmpeg is required to generate videos")
+    generate_dataset(tmp_path, num_samples=3, duration=2.0, resolution="64x48", frame_timestamps=2)
+    return tmp_path
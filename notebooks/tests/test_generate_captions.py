@@ -0,0 +1,82 @@
+import json
+
+import pytest
+import torch
+from transformers import AutoModelForImageTextToText, AutoProcessor
+
+MAX_NEW_TOKENS = 12
+
+
+@pytest.fixture
+def generation(notebook, tiny_model_path, dataset_path):
+    processor = AutoProcessor.from_pretrained(tiny_model_path, use_fast=True)
+    dataset = notebook.AnimeEpisodeCaptionDataset(dataset_path)
+    collator = notebook.ChatTemplateVLMCasualCollator(processor=processor, thread_paralleling=False)
+    vanila_model = AutoModelForImageTextToText.from_pretrained(tiny_model_path)
+    # Вторая модель с другими весами, чтобы описания моделей различались
+    trained_model = AutoModelForImageTextToText.from_pretrained(tiny_model_path)
+    generator = torch.Generator().manual_seed(1)
+    with torch.no_grad():
+        for param in trained_model.parameters():
+            param.add_(torch.randn(param.shape, generator=generator) * 0.05)
+    models = {"vanila": vanila_model, "trained": trained_model}
+    return dataset, collator, models
+
+
+def _read_results(output_path) -> list[dict]:
+    with open(output_path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _captions(results: list[dict]) -> dict[tuple[str, str], str]:
+    return {(result["id"], result["model"]): result["caption"] for result in results}
+
+
+def test_batched_generation_matches_unbatched(notebook, generation, tmp_path):
+    dataset, collator, models = generation
+    indices = list(range(len(dataset)))
+    # Длины входов различаются - в батче используется padding слева
+    lengths = {
+        collator._apply_chat_template(
+            dataset[idx]["messages"][:-1],
+            add_generation_prompt=True,
+            return_tensors="pt"
+        )["input_ids"].shape[1]
+        for idx in indices
+    }
+    assert len(lengths) > 1
+
+    unbatched = notebook.generate_captions(
+        models, collator, dataset, indices, tmp_path / "unbatched.jsonl", batch_size=1, max_new_tokens=MAX_NEW_TOKENS
+    )
+    batched = notebook.generate_captions(
+        models, collator, dataset, indices, tmp_path / "batched.jsonl", batch_size=len(indices),
+        max_new_tokens=MAX_NEW_TOKENS
+    )
+    assert len(unbatched) == len(batched) == len(indices) * len(models)
+    assert any(result["caption"] for result in unbatched)
+    assert _captions(batched) == _captions(unbatched)
+
+
+def test_resume_does_not_duplicate_results(notebook, generation, tmp_path):
+    dataset, collator, models = generation
+    indices = list(range(len(dataset)))
+    output_path = tmp_path / "captions.jsonl"
+    expected = _captions(notebook.generate_captions(
+        models, collator, dataset, indices, output_path, batch_size=2, max_new_tokens=MAX_NEW_TOKENS
+    ))
+    # Повторный запуск по полному файлу ничего не генерирует
+    assert notebook.generate_captions(models, collator, dataset, indices, output_path, batch_size=2) == []
+
+    # Прерванный запуск: сохранены 3 результата и часть строки четвертого
+    lines = output_path.read_text(encoding="utf-8").splitlines(keepends=True)
+    output_path.write_text("".join(lines[:3]) + lines[3][:10], encoding="utf-8")
+    kept = set(_captions([json.loads(line) for line in lines[:3]]))
+
+    resumed = notebook.generate_captions(
+        models, collator, dataset, indices, output_path, batch_size=2, max_new_tokens=MAX_NEW_TOKENS
+    )
+    assert set(_captions(resumed)) == set(expected) - kept
+    results = _read_results(output_path)
+    assert len(results) == len(expected)
+    assert _captions(results) == expected
@@ -0,0 +1,68 @@
+import os
+
+import pytest
+import torch
+from transformers import AutoModelForImageTextToText, AutoProcessor
+
+
+@pytest.fixture
+def pipeline(notebook, tiny_model_path, dataset_path):
+    processor = AutoProcessor.from_pretrained(tiny_model_path, use_fast=True)
+    dataset = notebook.AnimeEpisodeCaptionDataset(dataset_path)
+    collator = notebook.ChatTemplateVLMCasualCollator(processor=processor, thread_paralleling=False)
+    model = AutoModelForImageTextToText.from_pretrained(tiny_model_path)
+    # Кеш допустим только для замороженной визуальной части
+    model.requires_grad_(False)
+    return processor, dataset, collator, model
+
+
+def test_cache_hit_matches_fresh_forward(notebook, pipeline, tmp_path):
+    processor, dataset, collator, model = pipeline
+    cache = notebook.VisionFeatureCache(tmp_path / "cache", "tiny", processor)
+    assert cache.build(dataset, collator, model) == len(dataset)
+    assert cache.build(dataset, collator, model) == 0
+
+    cached_dataset = notebook.CachedFeatureDataset(cache, dataset)
+    for idx in range(len(dataset)):
+        instance = collator.single_message_prepare(dataset[idx]["messages"])
+        with torch.no_grad():
+            features = model.get_image_features(instance["pixel_values"], instance.get("pixel_attention_mask"))
+        cached = cached_dataset[idx]
+        # Признаки хранятся в float16
+        assert torch.equal(cached["image_hidden_states"], features.to(torch.float16))
+        for name in ("input_ids", "attention_mask", "labels"):
+            assert torch.equal(cached[name], instance[name])
+
+    # Батч из кеша даёт тот же loss, что и батч с кадрами
+    with torch.no_grad():
+        loss = model(**collator([dataset[0], dataset[1]])).loss
+        cached_loss = model(**collator([cached_dataset[0], cached_dataset[1]])).loss
+    torch.testing.assert_close(cached_loss, loss, rtol=1e-3, atol=1e-3)
+
+
+@pytest.mark.parametrize("change", ["mtime", "size"])
+def test_changed_video_invalidates_cache(notebook, pipeline, tmp_path, change):
+    processor, dataset, collator, model = pipeline
+    cache = notebook.VisionFeatureCache(tmp_path / "cache", "tiny", processor)
+    cache.build(dataset, collator, model)
+    key = cache.sample_key(dataset, 0)
+
+    video_path = dataset.dataset_path / dataset.get_anime_data_by_idx(0).video_path
+    video_stat = video_path.stat()
+    if change == "mtime":
+        os.utime(video_path, ns=(video_stat.st_atime_ns, video_stat.st_mtime_ns + 10 ** 9))
+    else:
+        # Видео перезаписано файлом другого размера с тем же временем изменения
+        with open(video_path, "ab") as f:
+            f.write(b"\0")
+        os.utime(video_path, ns=(video_stat.st_atime_ns, video_stat.st_mtime_ns))
+
+    new_key = cache.sample_key(dataset, 0)
+    assert new_key != key
+    assert not cache.contains(new_key)
+    # Остальные примеры остаются в кеше
+    assert all(cache.contains(cache.sample_key(dataset, idx)) for idx in range(1, len(dataset)))
+    with pytest.raises(ValueError):
+        notebook.CachedFeatureDataset(cache, dataset)
+    assert cache.build(dataset, collator, model) == 1
+    assert cache.contains(new_key)
@@ -0,0 +1,102 @@
+import json
+from hashlib import md5
+from pathlib import Path
+
+
+class CrawlCursor:
+    """
+    Сохраняемое состояние обхода страниц Shikimori.
+
+    Для каждой пройденной страницы хранится список полученных id аниме и признак полной обработки страницы
+    (все аниме сохранены или отброшены фильтрами). Продолжение сбора начинается с первой необработанной страницы,
+    полностью обработанные страницы пропускаются без запроса к Shikimori.
+    Состояние сбрасывается автоматически, если изменился запрос или размер страницы (`batch_size`).
+    """
+    def __init__(self, path: str | Path, query: str, batch_size: int):
+        """
+        Args:
+            path (str | Path): Путь до файла состояния
+            query (str): GraphQL запрос списка аниме
+            batch_size (int): Количество аниме на странице
+        """
+        self.path = Path(path)
+        self.query_hash = md5(query.encode("utf-8")).hexdigest()
+        self.batch_size = batch_size
+        self.pages: dict[int, dict] = {}
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        # Если изменился запрос или размер страницы - номера страниц не соответствуют сохранённым
+        if state.get("query_hash") != self.query_hash or state.get("batch_size") != self.batch_size:
+            return
+        self.pages = {int(page): page_state for page, page_state in state["pages"].items()}
+
+    def _save(self):
+        state = {
+            "query_hash": self.query_hash,
+            "batch_size": self.batch_size,
+            "pages": {str(page): self.pages[page] for page in sorted(self.pages)},
+        }
+        # Сохраним данные во временный json и заменим им исходный
+        tmp_path = self.path.with_stem(f"{self.path.stem}~")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=4)
+        self.path.unlink(missing_ok=True)
+        tmp_path.rename(self.path)
+
+    def reset(self):
+        """ Сбросить состояние обхода """
+        self.pages = {}
+        self.path.unlink(missing_ok=True)
+
+    def next_page(self, after: int | None = None) -> int:
+        """
+        Номер следующей необработанной страницы.
+
+        Args:
+            after (int | None): Номер текущей страницы (None - поиск с первой страницы)
+
+        Returns:
+            (int): Номер страницы (с 0)
+        """
+        page = 0 if after is None else after + 1
+        while self.pages.get(page, {}).get("finished", False):
+            page += 1
+        return page
+
+    def reopen_pages(self, ids: list[str]) -> list[int]:
+        """
+        Отметить необработанными страницы, содержащие указанные аниме (для повторной попытки их обработки).
+
+        Args:
+            ids (list[str]): id аниме
+
+        Returns:
+            (list[int]): Номера открытых повторно страниц
+        """
+        ids = set(map(str, ids))
+        pages = [
+            page for page, page_state in sorted(self.pages.items())
+            if page_state["finished"] and ids.intersection(page_state["ids"])
+        ]
+        if pages:
+            for page in pages:
+                self.pages[page]["finished"] = False
+            self._save()
+        return pages
+
+    def update_page(self, page: int, ids: list[str], finished: bool):
+        """
+        Сохранить состояние страницы.
+
+        Args:
+            page (int): Номер страницы
+            ids (list[str]): id аниме, полученные на странице
+            finished (bool): Обработаны ли все аниме страницы
+        """
+        self.pages[page] = {"ids": ids, "finished": finished}
+        self._save()
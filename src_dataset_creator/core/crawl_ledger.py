@@ -0,0 +1,177 @@
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+
+class CrawlLedger:
+    """
+    Общий журнал страниц Shikimori для распределенного сбора данных несколькими обработчиками.
+
+    Обработчик захватывает страницу в аренду (lease) на `lease_seconds` секунд и после обработки отмечает её
+    выполненной. Если обработчик упал, не завершив страницу, после истечения аренды её захватит другой обработчик.
+    Журнал хранится в SQLite файле, доступном всем обработчикам (к прим. на общем сетевом диске).
+    Все изменения выполняются в транзакциях `BEGIN IMMEDIATE`, поэтому одна страница не может
+    быть одновременно арендована двумя обработчиками.
+    """
+    def __init__(
+            self,
+            path: str | Path,
+            worker_id: str,
+            lease_seconds: float = 1800,
+            poll_interval: float = 10,
+    ):
+        """
+        Args:
+            path (str | Path): Путь до SQLite файла журнала
+            worker_id (str): Уникальное и постоянное между перезапусками имя обработчика. Определяет файлы его части
+                аннотации и кеша, поэтому перезапущенный обработчик продолжает работу со своим состоянием
+            lease_seconds (float): Время аренды страницы в секундах
+            poll_interval (float): Период опроса журнала, если все оставшиеся страницы арендованы другими обработчиками
+        """
+        if not worker_id or not re.fullmatch(r"[\w.-]+", worker_id):
+            raise ValueError(
+                f"Crawl worker requires a stable id of letters, digits, '.', '_' or '-' (got {worker_id!r}). "
+                f"Set `crawl_ledger.worker_id` in config or CRAWL_WORKER_ID environment variable"
+            )
+        self.path = Path(path)
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        with self._transaction() as cursor:
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "page INTEGER PRIMARY KEY, "
+                "status TEXT NOT NULL, "  # leased | done
+                "worker_id TEXT, "
+                "lease_expires REAL, "
+                "attempts INTEGER NOT NULL DEFAULT 0"
+                ")"
+            )
+            cursor.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # Страницы, арендованные этим обработчиком до перезапуска, сразу становятся доступными
+            cursor.execute(
+                "UPDATE pages SET lease_expires = 0 WHERE status = 'leased' AND worker_id = ?",
+                (self.worker_id,)
+            )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        """ Транзакция с блокировкой записи с момента начала (исключает гонки между обработчиками) """
+        cursor = self._connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield cursor
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        else:
+            cursor.execute("COMMIT")
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _end_page(cursor: sqlite3.Cursor) -> int | None:
+        row = cursor.execute("SELECT value FROM meta WHERE key = 'end_page'").fetchone()
+        return int(row[0]) if row is not None else None
+
+    def _try_claim(self) -> tuple[int | None, bool]:
+        """
+        Попытка захватить страницу.
+
+        Returns:
+            (tuple[int | None, bool]): Номер захваченной страницы и признак того, что необработанных страниц не осталось
+        """
+        now = time.time()
+        with self._transaction() as cursor:
+            end_page = self._end_page(cursor)
+            end_page = end_page if end_page is not None else -1
+            # Сначала - страницы с истекшей арендой (обработчик упал или отказался от страницы)
+            row = cursor.execute(
+                "SELECT page FROM pages "
+                "WHERE status = 'leased' AND lease_expires < ? AND (? < 0 OR page < ?) "
+                "ORDER BY page LIMIT 1",
+                (now, end_page, end_page)
+            ).fetchone()
+            if row is not None:
+                page = row[0]
+                cursor.execute(
+                    "UPDATE pages SET worker_id = ?, lease_expires = ?, attempts = attempts + 1 WHERE page = ?",
+                    (self.worker_id, now + self.lease_seconds, page)
+                )
+                return page, False
+            # Затем - следующая ещё не выданная страница
+            page = cursor.execute("SELECT COALESCE(MAX(page), -1) + 1 FROM pages").fetchone()[0]
+            if end_page < 0 or page < end_page:
+                cursor.execute(
+                    "INSERT INTO pages (page, status, worker_id, lease_expires, attempts) VALUES (?, 'leased', ?, ?, 1)",
+                    (page, self.worker_id, now + self.lease_seconds)
+                )
+                return page, False
+            # Все страницы выданы - проверим, остались ли незавершенные
+            leased = cursor.execute(
+                "SELECT COUNT(*) FROM pages WHERE status = 'leased' AND page < ?",
+                (end_page,)
+            ).fetchone()[0]
+            return None, leased == 0
+
+    def claim_page(self) -> int | None:
+        """
+        Захватить следующую необработанную страницу.
+        Если все оставшиеся страницы арендованы другими обработчиками - ожидает их завершения или истечения аренды.
+
+        Returns:
+            (int | None): Номер страницы (с 0). None - все страницы обработаны
+        """
+        while True:
+            page, finished = self._try_claim()
+            if page is not None or finished:
+                return page
+            time.sleep(self.poll_interval)
+
+    def renew(self, page: int):
+        """ Продлить аренду страницы """
+        with self._transaction() as cursor:
+            cursor.execute(
+                "UPDATE pages SET lease_expires = ? WHERE page = ? AND status = 'leased' AND worker_id = ?",
+                (time.time() + self.lease_seconds, page, self.worker_id)
+            )
+
+    def release(self, page: int):
+        """ Отказаться от страницы (она сразу станет доступна другим обработчикам) """
+        with self._transaction() as cursor:
+            cursor.execute(
+                "UPDATE pages SET lease_expires = 0 WHERE page = ? AND status = 'leased' AND worker_id = ?",
+                (page, self.worker_id)
+            )
+
+    def complete(self, page: int):
+        """ Отметить страницу обработанной """
+        with self._transaction() as cursor:
+            cursor.execute(
+                "UPDATE pages SET status = 'done', worker_id = ?, lease_expires = NULL WHERE page = ?",
+                (self.worker_id, page)
+            )
+
+    def mark_end(self, page: int):
+        """ Отметить страницу `page` как первую пустую страницу (конец списка аниме) """
+        with self._transaction() as cursor:
+            end_page = self._end_page(cursor)
+            if end_page is None or page < end_page:
+                cursor.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('end_page', ?)",
+                    (str(page),)
+                )
+            cursor.execute(
+                "UPDATE pages SET status = 'done', lease_expires = NULL WHERE page = ?",
+                (page,)
+            )
+
+    def close(self):
+        self._connection.close()
+
@@ -0,0 +1,168 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator
+
+LOGGER = logging.getLogger(__name__)
+
+
+class DiskBudget:
+    """
+    Контроль свободного места на диске для параллельных загрузок.
+
+    Перед началом загрузки серии на дисках временных файлов и сохранения резервируется оцененный объём данных.
+    Если после резервирования свободного места останется меньше `min_free_gb`, загрузка ожидает, пока место не
+    освободится до `resume_free_gb` (гистерезис исключает частые переключения на границе). Уже начатые
+    загрузки продолжаются - ожидают только новые. Записанные загрузкой данные уже учтены в свободном месте диска,
+    поэтому из него вычитается только ещё не записанная часть резерва (по размеру директории загрузки).
+    """
+    def __init__(
+            self,
+            min_free_gb: float = 5.0,
+            resume_free_gb: float | None = None,
+            bitrate_mbps: float = 4.0,
+            reserve_factor: float = 2.0,
+            poll_interval: float = 5.0,
+            max_wait: float | None = 3600,
+    ):
+        """
+        Args:
+            min_free_gb (float): Минимальный объём свободного места (в ГБ), ниже которого новые загрузки не начинаются
+            resume_free_gb (float | None): Объём свободного места (в ГБ), при котором загрузки возобновляются
+                (None - равен `min_free_gb`)
+            bitrate_mbps (float): Начальная оценка битрейта видео (в Мбит/сек) для расчёта размера сегментов
+                без известного размера. Уточняется по фактическим загрузкам
+            reserve_factor (float): Множитель резервируемого объёма к размеру сегментов
+                (учитывает временный файл склеенного видео)
+            poll_interval (float): Период проверки свободного места при ожидании (в секундах)
+            max_wait (float | None): Максимальное время ожидания свободного места (в секундах), после которого
+                возбуждается TimeoutError (None - без ограничения)
+        """
+        self.min_free = int(min_free_gb * 2 ** 30)
+        self.resume_free = int((resume_free_gb if resume_free_gb is not None else min_free_gb) * 2 ** 30)
+        self.bytes_per_second = bitrate_mbps * 10 ** 6 / 8
+        self.reserve_factor = reserve_factor
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self._condition = threading.Condition()
+        # Активные резервы: (устройства, объём в байтах, директория записываемых загрузкой данных)
+        self._reservations: list[tuple[dict[int, Path], int, Path | None]] = []
+        self._paused = False
+
+    @staticmethod
+    def _existing_path(path: Path) -> Path:
+        """ Ближайшая существующая директория пути (директория сохранения может быть ещё не создана) """
+        path = Path(path).absolute()
+        while not path.exists() and path != path.parent:
+            path = path.parent
+        return path
+
+    def _devices(self, paths: Iterable[str | Path]) -> dict[int, Path]:
+        devices = {}
+        for path in paths:
+            path = self._existing_path(path)
+            devices.setdefault(os.stat(path).st_dev, path)
+        return devices
+
+    @staticmethod
+    def _directory_size(path: Path) -> int:
+        size = 0
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    size += entry.stat().st_size if entry.is_file() else DiskBudget._directory_size(entry.path)
+                except FileNotFoundError:
+                    # Временные файлы сегментов переименовываются и удаляются во время загрузки
+                    continue
+        return size
+
+    def _unwritten(self, nbytes: int, track: Path | None) -> int:
+        """ Ещё не записанная часть резерва (записанные данные уже уменьшили свободное место диска) """
+        if track is None or not os.path.isdir(track):
+            return nbytes
+        return max(nbytes - self._directory_size(track), 0)
+
+    def _reserved(self, device: int) -> int:
+        return sum(
+            self._unwritten(nbytes, track)
+            for devices, nbytes, track in self._reservations
+            if device in devices
+        )
+
+    def _can_start(self, nbytes: int, devices: dict[int, Path]) -> bool:
+        threshold = self.resume_free if self._paused else self.min_free
+        for device, path in devices.items():
+            usage = shutil.disk_usage(path)
+            # Загрузка не поместится на диск даже после освобождения всего места
+            if usage.total - self.resume_free < nbytes:
+                raise OSError(
+                    f"Download of {nbytes / 2 ** 30:.2f} GB does not fit into disk '{path}' "
+                    f"of {usage.total / 2 ** 30:.1f} GB while keeping {self.resume_free / 2 ** 30:.1f} GB free"
+                )
+            free = usage.free - self._reserved(device)
+            if free - nbytes < threshold:
+                return False
+        return True
+
+    def estimate(self, duration: float, known_bytes: int = 0) -> int:
+        """
+        Оценка резервируемого объёма для загрузки.
+
+        Args:
+            duration (float): Длительность сегментов без известного размера (в секундах)
+            known_bytes (int): Суммарный размер сегментов с известным размером (в байтах)
+        """
+        return int((known_bytes + duration * self.bytes_per_second) * self.reserve_factor)
+
+    def update_bitrate(self, nbytes: int, duration: float, momentum: float = 0.8):
+        """ Уточнение оценки битрейта по фактическому размеру загруженных сегментов """
+        if duration <= 0 or nbytes <= 0:
+            return
+        with self._condition:
+            self.bytes_per_second = momentum * self.bytes_per_second + (1 - momentum) * nbytes / duration
+
+    @contextmanager
+    def reserve(self, nbytes: int, paths: Iterable[str | Path], track: str | Path | None = None) -> Iterator[None]:
+        """
+        Резервирование места на дисках путей `paths` на время загрузки.
+        Ожидает освобождения места, если его недостаточно.
+
+        Args:
+            nbytes (int): Резервируемый объём (в байтах)
+            paths (Iterable[str | Path]): Пути, на диски которых производится запись
+            track (str | Path | None): Директория записываемых загрузкой данных - их объём вычитается из резерва
+                (None - резерв учитывается полностью до завершения загрузки)
+        """
+        devices = self._devices(paths)
+        reservation = (devices, nbytes, Path(track) if track is not None else None)
+        start = time.monotonic()
+        with self._condition:
+            waiting = False
+            while not self._can_start(nbytes, devices):
+                if not waiting:
+                    LOGGER.warning(
+                        f"Not enough free disk space for {nbytes / 2 ** 30:.2f} GB download. "
+                        f"Waiting until {self.resume_free / 2 ** 30:.1f} GB is free..."
+                    )
+                waiting = True
+                self._paused = True
+                if self.max_wait is not None and time.monotonic() - start > self.max_wait:
+                    raise TimeoutError(
+                        f"No free disk space for {nbytes / 2 ** 30:.2f} GB download "
+                        f"after waiting {self.max_wait:.0f} sec (increase free space or `max_wait`)"
+                    )
+                self._condition.wait(self.poll_interval)
+            if self._paused:
+                LOGGER.info("Free disk space is available. Resuming downloads.")
+            self._paused = False
+            self._reservations.append(reservation)
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._reservations.remove(reservation)
+                self._condition.notify_all()
@@ -0,0 +1,193 @@
+"""
+Выбор кадров видео по смене сцен.
+
+Видео декодируется ffmpeg в низком разрешении, для каждого кадра вычисляется отличие от предыдущего
+(разность цветовых гистограмм и средняя разность яркости), после чего выбираются кадры с наибольшим отличием,
+равномерно разнесённые по видео. Все вычисления выполняются пакетами кадров в NumPy.
+"""
+import re
+import subprocess
+import threading
+from pathlib import Path
+
+import numpy as np
+
+_PTS_TIME_PATTERN = re.compile(r"pts_time:\s*([0-9.eE+-]+)")
+_LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _color_histograms(frames: np.ndarray, bins: int) -> np.ndarray:
+    """
+    Нормированные гистограммы каналов для пакета кадров.
+
+    Args:
+        frames (np.ndarray): Кадры формата [N, H, W, 3] (uint8)
+        bins (int): Количество интервалов гистограммы каждого канала
+
+    Returns:
+        (np.ndarray): Гистограммы формата [N, 3 * bins]
+    """
+    num_frames = len(frames)
+    pixels = frames.reshape(num_frames, -1, 3).astype(np.int64) * bins // 256
+    # Сдвинем индексы каналов и кадров, чтобы посчитать все гистограммы одним bincount
+    pixels += np.arange(3) * bins
+    pixels += (np.arange(num_frames) * 3 * bins)[:, None, None]
+    histograms = np.bincount(pixels.ravel(), minlength=num_frames * 3 * bins).reshape(num_frames, 3 * bins)
+    return histograms / (pixels.shape[1] * 3)
+
+
+def frame_change_scores(
+        video_path: str | Path,
+        size: tuple[int, int] = (64, 36),
+        sample_fps: float | None = None,
+        bins: int = 16,
+        batch_size: int = 512,
+        ffmpeg: str = "ffmpeg",
+        timeout: float | None = 600.0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Оценка отличия каждого кадра видео от предыдущего.
+
+    Args:
+        video_path (str | Path): Путь до видео
+        size (tuple[int, int]): Разрешение декодирования (ширина, высота)
+        sample_fps (float | None): Частота анализируемых кадров (None - все кадры видео)
+        bins (int): Количество интервалов цветовой гистограммы каждого канала
+        batch_size (int): Количество кадров, обрабатываемых за раз
+        ffmpeg (str): Путь до исполняемого файла ffmpeg
+        timeout (float | None): Максимальное время анализа в секундах, после которого ffmpeg завершается
+            и возбуждается TimeoutError (None - без ограничения)
+
+    Returns:
+        (tuple[np.ndarray, np.ndarray]): Время кадров (в секундах от начала видео) и оценки отличия [0, 2].
+            Первый кадр видео получает максимальную оценку
+    """
+    width, height = size
+    video_filter = f"scale={width}:{height},showinfo"
+    if sample_fps is not None:
+        video_filter = f"fps={sample_fps}," + video_filter
+    process = subprocess.Popen(
+        [
+            ffmpeg, "-hide_banner", "-loglevel", "info", "-nostdin",
+            "-i", str(video_path), "-an",
+            "-vf", video_filter,
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    # showinfo пишет строку на каждый кадр: stderr вычитывается в отдельном потоке, иначе при заполнении
+    # буфера канала ffmpeg заблокируется на записи в stderr, а чтение stdout - в ожидании кадров
+    stderr_chunks = []
+    stderr_thread = threading.Thread(target=lambda: stderr_chunks.extend(process.stderr), daemon=True)
+    stderr_thread.start()
+    timed_out = threading.Event()
+    watchdog = None
+    if timeout is not None:
+        watchdog = threading.Timer(timeout, lambda: (timed_out.set(), process.kill()))
+        watchdog.start()
+    try:
+        scores = _read_change_scores(process, width, height, bins, batch_size)
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        returncode = process.wait()
+        if watchdog is not None:
+            watchdog.cancel()
+        stderr_thread.join()
+    stderr = b"".join(stderr_chunks).decode(errors="replace")
+    if timed_out.is_set():
+        raise TimeoutError(f"ffmpeg did not decode '{video_path}' in {timeout} sec")
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg failed to decode '{video_path}':\n{stderr[-2000:]}")
+
+    timestamps = np.array([float(match) for match in _PTS_TIME_PATTERN.findall(stderr)])
+    if len(timestamps) != len(scores):
+        raise RuntimeError(f"Decoded {len(scores)} frames, but got {len(timestamps)} timestamps for '{video_path}'")
+    return timestamps, scores
+
+
+def _read_change_scores(
+        process: subprocess.Popen,
+        width: int,
+        height: int,
+        bins: int,
+        batch_size: int,
+) -> np.ndarray:
+    """ Чтение кадров из stdout ffmpeg и расчёт оценок отличия пакетами """
+    frame_bytes = width * height * 3
+    scores = []
+    previous_histogram, previous_luma = None, None
+    while True:
+        data = process.stdout.read(frame_bytes * batch_size)
+        num_frames = len(data) // frame_bytes
+        if num_frames == 0:
+            break
+        frames = np.frombuffer(data[:num_frames * frame_bytes], dtype=np.uint8).reshape(num_frames, height, width, 3)
+        histograms = _color_histograms(frames, bins)
+        luma = frames.astype(np.float32) @ _LUMA_WEIGHTS
+        # Добавим последний кадр предыдущего пакета для расчета разностей на границе пакетов
+        if previous_histogram is not None:
+            histograms = np.concatenate([previous_histogram, histograms])
+            luma = np.concatenate([previous_luma, luma])
+        histogram_diff = 0.5 * np.abs(np.diff(histograms, axis=0)).sum(axis=1)
+        luma_diff = np.abs(np.diff(luma, axis=0)).mean(axis=(1, 2)) / 255
+        if previous_histogram is None:
+            scores.append(np.array([2.0]))
+        scores.append(histogram_diff + luma_diff)
+        previous_histogram, previous_luma = histograms[-1:], luma[-1:]
+    return np.concatenate(scores) if scores else np.zeros(0)
+
+
+def select_scene_frames(
+        timestamps: np.ndarray,
+        scores: np.ndarray,
+        num_frames: int,
+        min_gap: float | None = None,
+) -> list[float]:
+    """
+    Выбор кадров с наибольшим отличием от предыдущих.
+
+    Кадры выбираются жадно по убыванию оценки с минимальным расстоянием `min_gap` между выбранными кадрами,
+    чтобы частые смены сцен (к прим. опенинг) не занимали весь бюджет кадров. Если таких кадров не хватает,
+    оставшиеся выбираются по убыванию оценки без ограничения расстояния.
+
+    Args:
+        timestamps (np.ndarray): Время кадров в секундах
+        scores (np.ndarray): Оценки отличия кадров
+        num_frames (int): Количество выбираемых кадров
+        min_gap (float | None): Минимальное расстояние между кадрами в секундах
+            (None - половина среднего расстояния между `num_frames` равномерно распределенными кадрами)
+
+    Returns:
+        (list[float]): Время выбранных кадров по возрастанию
+    """
+    if len(timestamps) <= num_frames:
+        return timestamps.tolist()
+    if min_gap is None:
+        min_gap = (timestamps[-1] - timestamps[0]) / num_frames / 2
+    order = np.argsort(-scores, kind="stable")
+    selected = []
+    for idx in order:
+        if len(selected) == num_frames:
+            break
+        if not selected or np.abs(timestamps[selected] - timestamps[idx]).min() >= min_gap:
+            selected.append(idx)
+    if len(selected) < num_frames:
+        selected_set = set(selected)
+        selected += [idx for idx in order if idx not in selected_set][:num_frames - len(selected)]
+    return np.sort(timestamps[selected]).tolist()
+
+
+def select_scene_timestamps(video_path: str | Path, num_frames: int, **kwargs) -> list[float]:
+    """
+    Время `num_frames` кадров видео с наибольшим отличием от предыдущих (в секундах от начала файла).
+
+    Args:
+        video_path (str | Path): Путь до видео
+        num_frames (int): Количество выбираемых кадров
+        **kwargs: Параметры `frame_change_scores`
+    """
+    timestamps, scores = frame_change_scores(video_path, **kwargs)
+    return [round(timestamp, 3) for timestamp in select_scene_frames(timestamps, scores, num_frames)]
@@ -0,0 +1,158 @@
+"""
+Потоковый разбор HLS (m3u8) манифестов медиа-плейлистов.
+
+Спецификация формата: https://datatracker.ietf.org/doc/html/rfc8216
+"""
+import io
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+
+
+class HLSManifestError(ValueError):
+    """ Ошибка формата HLS манифеста """
+
+
+@dataclass(slots=True, frozen=True)
+class HLSSegment:
+    """ Сегмент медиа-плейлиста """
+    sequence: int
+    """ Порядковый номер сегмента (с учётом #EXT-X-MEDIA-SEQUENCE) """
+    uri: str
+    """ Ссылка на сегмент (абсолютная, если при разборе задан `base_url`) """
+    duration: float
+    """ Длительность сегмента в секундах (#EXTINF) """
+    start: float
+    """ Время начала сегмента от начала плейлиста в секундах """
+    byte_offset: int | None = None
+    """ Смещение сегмента в байтах внутри ресурса (#EXT-X-BYTERANGE) """
+    byte_length: int | None = None
+    """ Размер сегмента в байтах (#EXT-X-BYTERANGE) """
+
+    @property
+    def end(self) -> float:
+        """ Время окончания сегмента от начала плейлиста в секундах """
+        return self.start + self.duration
+
+
+@dataclass(slots=True)
+class HLSManifest:
+    """ Медиа-плейлист """
+    segments: list[HLSSegment] = field(default_factory=list)
+    target_duration: float | None = None
+    """ Максимальная длительность сегмента (#EXT-X-TARGETDURATION) """
+    media_sequence: int = 0
+    """ Номер первого сегмента (#EXT-X-MEDIA-SEQUENCE) """
+    ended: bool = False
+    """ Присутствует ли маркер окончания плейлиста (#EXT-X-ENDLIST) """
+
+    @property
+    def duration(self) -> float:
+        """ Общая длительность плейлиста в секундах """
+        return self.segments[-1].end if self.segments else 0.0
+
+
+def _resolve_uri(uri: str, base_url: str) -> str:
+    if "://" in uri or uri.startswith("//"):
+        return uri
+    return base_url + uri.removeprefix("./")
+
+
+def _parse_attribute(line: str) -> str:
+    return line.partition(":")[2].strip()
+
+
+def iter_hls_segments(
+        lines: Iterable[str],
+        base_url: str = "",
+        manifest: HLSManifest | None = None,
+) -> Iterator[HLSSegment]:
+    """
+    Потоковый разбор сегментов медиа-плейлиста без загрузки всего манифеста в память.
+
+    Args:
+        lines (Iterable[str]): Строки манифеста
+        base_url (str): Префикс для относительных ссылок на сегменты
+        manifest (HLSManifest | None): Если задан - в него записываются заголовки плейлиста (сегменты не добавляются)
+
+    Returns:
+        (Iterator[HLSSegment]): Сегменты в порядке следования в плейлисте
+
+    Raises:
+        HLSManifestError: Если манифест не соответствует формату медиа-плейлиста
+    """
+    manifest = manifest if manifest is not None else HLSManifest()
+    header_checked = False
+    sequence = None
+    start = 0.0
+    duration = None
+    byte_length = byte_offset = None
+    next_byte_offset = 0
+    for line_num, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        if not header_checked:
+            if line != "#EXTM3U":
+                raise HLSManifestError(f"Manifest must start with #EXTM3U, got '{line[:50]}'")
+            header_checked = True
+            continue
+        if line.startswith("#"):
+            if line.startswith("#EXTINF:"):
+                try:
+                    duration = float(_parse_attribute(line).split(",", 1)[0])
+                except ValueError:
+                    raise HLSManifestError(f"Invalid #EXTINF duration at line {line_num}: '{line}'") from None
+            elif line.startswith("#EXT-X-BYTERANGE:"):
+                length, _, offset = _parse_attribute(line).partition("@")
+                byte_length = int(length)
+                byte_offset = int(offset) if offset else next_byte_offset
+            elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+                manifest.media_sequence = int(_parse_attribute(line))
+            elif line.startswith("#EXT-X-TARGETDURATION:"):
+                manifest.target_duration = float(_parse_attribute(line))
+            elif line.startswith("#EXT-X-ENDLIST"):
+                manifest.ended = True
+            elif line.startswith("#EXT-X-STREAM-INF"):
+                raise HLSManifestError("Master playlists are not supported, media playlist expected")
+            # Остальные теги и комментарии на список сегментов не влияют
+            continue
+        # Строка без "#" - ссылка на сегмент
+        if duration is None:
+            raise HLSManifestError(f"Segment URI without #EXTINF at line {line_num}: '{line}'")
+        if sequence is None:
+            sequence = manifest.media_sequence
+        yield HLSSegment(
+            sequence=sequence,
+            uri=_resolve_uri(line, base_url),
+            duration=duration,
+            start=start,
+            byte_offset=byte_offset,
+            byte_length=byte_length,
+        )
+        sequence += 1
+        start += duration
+        if byte_length is not None:
+            next_byte_offset = byte_offset + byte_length
+        duration = None
+        byte_length = byte_offset = None
+    if not header_checked:
+        raise HLSManifestError("Empty manifest")
+    if duration is not None:
+        raise HLSManifestError("Manifest ends with #EXTINF without segment URI")
+
+
+def parse_hls_manifest(manifest: str | Iterable[str], base_url: str = "") -> HLSManifest:
+    """
+    Разбор медиа-плейлиста.
+
+    Args:
+        manifest (str | Iterable[str]): Текст манифеста или итератор по его строкам
+        base_url (str): Префикс для относительных ссылок на сегменты
+
+    Returns:
+        (HLSManifest): Заголовки и сегменты плейлиста
+    """
+    lines = io.StringIO(manifest) if isinstance(manifest, str) else manifest
+    result = HLSManifest()
+    result.segments = list(iter_hls_segments(lines, base_url=base_url, manifest=result))
+    return result
@@ -1,26 +1,31 @@
 """
 Based on https://github.com/YaNesyTortiK/Kodik-Download-Watch/blob/main/fast_download.py
 """
+import bisect
 import enum
+import json
 import shutil
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import List, Literal
+from typing import Iterator, List, Literal
+from urllib.parse import urlparse
 
 import requests
 import os
 import concurrent.futures
 import subprocess
 from hashlib import md5
+from importlib.util import find_spec
 from pathlib import Path
 
-from anime_parsers_ru import KodikParser
+from core.disk_budget import DiskBudget
+from core.hls_manifest import HLSManifest, HLSSegment, parse_hls_manifest
 
-# Проверим доступность lxml
-try:
-    import lxml
-    USE_LXML = True
-except ImportError:
-    USE_LXML = False
+# Проверим доступность lxml (без импорта - он нужен только парсеру Kodik)
+USE_LXML = find_spec('lxml') is not None
 
 
 def check_ffmpeg():
@@ -50,15 +55,105 @@ class TranslationInfo:
     """ Имя команды озвучки/перевода с количеством серий """
 
 
+class SegmentLatencyTracker:
+    """
+    Скользящее распределение времени загрузки сегментов отдельно для каждого хоста.
+
+    На его основе рассчитывается адаптивный таймаут загрузки сегмента и задержка,
+    после которой на медленный сегмент отправляется дублирующий (hedged) запрос.
+    """
+    def __init__(
+            self,
+            window_size: int = 256,
+            min_samples: int = 16,
+            timeout_quantile: float = 0.99,
+            timeout_factor: float = 3.0,
+            min_timeout: float = 5.0,
+            max_timeout: float = 40.0,
+    ):
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.timeout_quantile = timeout_quantile
+        self.timeout_factor = timeout_factor
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._latencies: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=self.window_size))
+        self._lock = threading.Lock()
+
+    def add(self, host: str, latency: float):
+        """ Добавить время загрузки сегмента с хоста `host` """
+        with self._lock:
+            self._latencies[host].append(latency)
+
+    def quantile(self, host: str, q: float) -> float | None:
+        """
+        Квантиль времени загрузки сегмента для хоста.
+
+        Returns:
+            (float | None): Значение квантиля. None - если наблюдений для хоста недостаточно
+        """
+        with self._lock:
+            latencies = sorted(self._latencies[host])
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+    def timeout(self, host: str) -> float:
+        """ Адаптивный таймаут загрузки сегмента для хоста """
+        latency = self.quantile(host, self.timeout_quantile)
+        if latency is None:
+            return self.max_timeout
+        return min(max(latency * self.timeout_factor, self.min_timeout), self.max_timeout)
+
+
 class KodikFastDownloader:
+    protocol = 'https:'
+    """ Протокол ссылок на видео (ссылки Kodik не содержат протокола) """
+    tmp_format_version = 2
+    """
+    Версия формата временной директории сегментов. Входит в её имя, чтобы сегменты, сохранённые с другой
+    нумерацией, не использовались повторно (директории `<hash>~` без версии - номер из ссылки `seg-N` с 1,
+    версия 2 - номер от #EXT-X-MEDIA-SEQUENCE с 0). Устаревшие директории удаляются очисткой набора данных
+    (tools/clear_mo_matched_dataset_files.py)
+    """
+
     def __init__(
             self,
             tmp_root: str | Path = 'tmp',
             segment_timeout: int = 40,
+            hedge_quantile: float | None = 0.95,
+            segment_retries: int = 3,
+            latency_window: int = 256,
+            hwaccel: str | None = 'cuda',
+            kodik_token: str | None = None,
+            disk_budget: DiskBudget | None = None,
     ):
+        """
+        Args:
+            tmp_root (str | Path): Директория для временного хранения сегментов
+            segment_timeout (int): Максимальное время ожидания загрузки сегмента (в секундах).
+                Фактический таймаут адаптируется под распределение времени загрузки с каждого хоста
+            hedge_quantile (float | None): Квантиль времени загрузки, после превышения которого на сегмент
+                отправляется дублирующий запрос (используется ответ, пришедший первым). None - без дублирования
+            segment_retries (int): Количество повторных загрузок сегмента после ошибки (с экспоненциальной задержкой),
+                после которых загрузка серии завершается ошибкой
+            latency_window (int): Количество последних загрузок, по которым оценивается распределение времени загрузки
+            hwaccel (str | None): Аппаратное ускорение ffmpeg при склеивании сегментов (None - без ускорения)
+            kodik_token (str | None): Токен Kodik (None - получить автоматически)
+            disk_budget (DiskBudget | None): Контроль свободного места - загрузка серии начинается только после
+                резервирования места под её сегменты и склеенное видео (None - без контроля)
+        """
+        # Парсер Kodik (и его зависимости) загружается только при создании загрузчика
+        from anime_parsers_ru import KodikParser
+
         self.tmp_root = Path(tmp_root)
-        self.kodik_parser = KodikParser(use_lxml=USE_LXML)
+        self.kodik_parser = KodikParser(token=kodik_token, use_lxml=USE_LXML)
+        self.hwaccel = hwaccel
         self.segment_timeout = segment_timeout
+        self.hedge_quantile = hedge_quantile
+        self.segment_retries = segment_retries
+        self.latency_tracker = SegmentLatencyTracker(window_size=latency_window, max_timeout=segment_timeout)
+        self.disk_budget = disk_budget
 
     @staticmethod
     def _get_url_data(url: str, headers: dict = None):
@@ -89,55 +184,177 @@ class KodikFastDownloader:
         return result
 
     @staticmethod
-    def _get_segments(manifest: str, original_link: str) -> list[str]:
-        res = []
-        manifest = manifest.split('\n')[7:]
-        for i in range(0, len(manifest), 2):
-            if manifest[i].strip() != '':
-                res.append([original_link + manifest[i][2:], manifest[i].split('-')[1]])
-        return res
+    def _get_manifest(manifest: str, original_link: str) -> HLSManifest:
+        return parse_hls_manifest(manifest, base_url=original_link)
 
     @staticmethod
-    def _download_segment(link: str, path: str | Path, timeout=None):
+    def _download_segment(link: str, path: str | Path, timeout=None, headers: dict | None = None):
         try:
-            res = requests.get(link, timeout=timeout)
+            res = requests.get(link, timeout=timeout, headers=headers)
         except requests.exceptions.SSLError:
             # Sometimes this error can appear. Possibly because of high count of downloads at the same time
-            res = requests.get(link, timeout=timeout)
+            res = requests.get(link, timeout=timeout, headers=headers)
+        res.raise_for_status()
         with open(path, 'wb') as f:
             f.write(res.content)
 
+    @staticmethod
+    def _is_retryable(error: BaseException) -> bool:
+        """ Временная ли ошибка загрузки сегмента (сетевые ошибки, ответы 5xx и 429 - повторяются) """
+        if isinstance(error, requests.exceptions.HTTPError):
+            status = error.response.status_code if error.response is not None else None
+            return status is None or status >= 500 or status == 429
+        return isinstance(error, (requests.exceptions.RequestException, OSError))
+
+    def _download_segment_tracked(
+            self,
+            segment: HLSSegment,
+            path: Path,
+            start_times: dict[Path, float],
+            delay: float = 0.0,
+    ):
+        """ Загрузка сегмента (через `delay` секунд) с учётом времени загрузки в распределении хоста """
+        time.sleep(delay)
+        host = urlparse(segment.uri).netloc
+        headers = None
+        # Сегмент может быть частью общего файла
+        if segment.byte_length is not None:
+            headers = {'Range': f'bytes={segment.byte_offset}-{segment.byte_offset + segment.byte_length - 1}'}
+        start_times[path] = time.monotonic()
+        self._download_segment(segment.uri, path, timeout=self.latency_tracker.timeout(host), headers=headers)
+        self.latency_tracker.add(host, time.monotonic() - start_times[path])
+
+    def _download_segments(self, segments: list[HLSSegment], tmp_dir: Path):
+        """
+        Параллельная загрузка сегментов во временную директорию.
+
+        Если сегмент загружается дольше квантиля `hedge_quantile` времени загрузки с его хоста,
+        на него отправляется дублирующий запрос. Сохраняется результат запроса, завершившегося первым.
+        Сегмент, все запросы которого завершились временной ошибкой (сетевая ошибка, ответ 5xx или 429),
+        загружается повторно до `segment_retries` раз.
+        """
+        # Задачи вида: future -> (номер сегмента, сегмент, временный путь)
+        tasks: dict[concurrent.futures.Future, tuple[int, HLSSegment, Path]] = {}
+        # Незавершенные сегменты вида: номер сегмента -> количество запущенных запросов
+        attempts: dict[int, int] = {}
+        # Количество повторных загрузок сегментов после ошибки: номер сегмента -> количество
+        retries: dict[int, int] = defaultdict(int)
+        start_times: dict[Path, float] = {}
+        deadline = time.monotonic() + 2 * len(segments)
+        executor = concurrent.futures.ThreadPoolExecutor()
+        try:
+            for segment in segments:
+                num = segment.sequence
+                segment_path = Path(tmp_dir, f'{num}.ts')
+                # Если сегмент скачен - пропустим
+                if os.path.exists(segment_path):
+                    continue
+                # Скачаем сегмент во временный файл
+                tmp_segment_path = segment_path.with_stem(f'{segment_path.stem}~')
+                tmp_segment_path.unlink(missing_ok=True)
+                future = executor.submit(self._download_segment_tracked, segment, tmp_segment_path, start_times)
+                tasks[future] = (num, segment, tmp_segment_path)
+                attempts[num] = 1
+            while attempts:
+                done, _ = concurrent.futures.wait(
+                    tasks.keys(),
+                    timeout=min(1.0, max(deadline - time.monotonic(), 0)),
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    num, segment, tmp_segment_path = tasks.pop(future)
+                    # Если сегмент уже получен другим запросом - ответ не нужен
+                    if num not in attempts:
+                        continue
+                    attempts[num] -= 1
+                    if future.exception() is not None:
+                        # Ошибка существенна, только если не осталось других запросов на этот сегмент
+                        if attempts[num] > 0:
+                            continue
+                        # Постоянные ошибки (к прим. 404) не повторяются
+                        if retries[num] >= self.segment_retries or not self._is_retryable(future.exception()):
+                            raise future.exception()
+                        retries[num] += 1
+                        retry_future = executor.submit(
+                            self._download_segment_tracked, segment, tmp_segment_path, start_times,
+                            delay=min(2 ** (retries[num] - 1), 10),
+                        )
+                        tasks[retry_future] = (num, segment, tmp_segment_path)
+                        attempts[num] = 1
+                        continue
+                    # Переименуем сегмент
+                    tmp_segment_path.rename(Path(tmp_dir, f'{num}.ts'))
+                    del attempts[num]
+                if attempts and time.monotonic() > deadline:
+                    raise TimeoutError(f'{len(attempts)} (of {len(segments)}) segments are not downloaded in time')
+                if self.hedge_quantile is None:
+                    continue
+                # Продублируем запросы для сегментов, загружающихся дольше обычного
+                now = time.monotonic()
+                for future, (num, segment, tmp_segment_path) in list(tasks.items()):
+                    if attempts.get(num) != 1 or tmp_segment_path not in start_times:
+                        continue
+                    hedge_delay = self.latency_tracker.quantile(urlparse(segment.uri).netloc, self.hedge_quantile)
+                    if hedge_delay is None or now - start_times[tmp_segment_path] < hedge_delay:
+                        continue
+                    hedge_segment_path = tmp_segment_path.with_stem(f'{tmp_segment_path.stem}h')
+                    hedge_segment_path.unlink(missing_ok=True)
+                    hedge_future = executor.submit(
+                        self._download_segment_tracked, segment, hedge_segment_path, start_times
+                    )
+                    tasks[hedge_future] = (num, segment, hedge_segment_path)
+                    attempts[num] += 1
+        finally:
+            # Не будем дожидаться проигравших дублирующих запросов - их результаты не используются.
+            # Их временные файлы удаляются после завершения запроса (иначе запрос мог бы создать файл заново)
+            for future, (_, _, tmp_segment_path) in tasks.items():
+                future.add_done_callback(lambda _, path=tmp_segment_path: path.unlink(missing_ok=True))
+            executor.shutdown(wait=False, cancel_futures=True)
+
     @staticmethod
     def _combine_segments(
             directory: str | Path,
             output_path: str | Path,
             fps: str | None = None,
             with_audio: bool = True,
-            hwaccel: str | None = 'cuda'
+            hwaccel: str | None = 'cuda',
+            sequences: list[int] | None = None,
+            max_size: int | None = None,
     ):
         directory: Path = Path(directory)
-        files = list(path for path in directory.iterdir() if path.suffix == '.ts')
+        if sequences is not None:
+            files = [Path(directory, f'{num}.ts') for num in sequences]
+        else:
+            # Незавершенные (временные) сегменты имеют суффикс "~" в имени и не учитываются
+            files = list(path for path in directory.iterdir() if path.suffix == '.ts' and path.stem.isdigit())
         r = ''
         for file in sorted(files, key=lambda path: int(path.stem)):
             r += f"file {file.name}\n"
         with open(directory / 'files.txt', 'w') as f:
             f.write(r)
+        ffmpeg_input_param = ['-hwaccel', hwaccel] if hwaccel is not None else []
         ffmpeg_output_param = []
         if not with_audio:
             ffmpeg_output_param.append('-an')
+        if max_size is not None:
+            # Уменьшим большую сторону кадра до max_size с сохранением пропорций (без увеличения, чётные размеры)
+            ffmpeg_output_param.extend([
+                '-vf',
+                f"scale='if(gte(iw,ih),min({max_size},iw),-2)':'if(gte(iw,ih),-2,min({max_size},ih))'"
+            ])
         if fps is not None:
-            ffmpeg_output_param.append(f'-r {fps}')
-        else:
-            ffmpeg_output_param.append(f'-c copy')
+            ffmpeg_output_param.extend(['-r', str(fps)])
+        # Без изменения частоты кадров и размера перекодирование не требуется
+        if fps is None and max_size is None:
+            ffmpeg_output_param.extend(['-c', 'copy'])
         try:
             subprocess.run(
-                f'ffmpeg '
-                f'-y {"-hwaccel " + hwaccel if not hwaccel is None else ""} '
-                f'-f concat '
-                f'-safe 0 '
-                f'-i {directory / "files.txt"} '
-                f'{" ".join(ffmpeg_output_param)} '
-                f'"{output_path}"',
+                [
+                    'ffmpeg', '-y', *ffmpeg_input_param,
+                    '-f', 'concat', '-safe', '0', '-i', str(directory / "files.txt"),
+                    *ffmpeg_output_param,
+                    str(output_path)
+                ],
                 # capture_output=True,
                 check=True,
                 stderr=subprocess.PIPE
@@ -146,6 +363,39 @@ class KodikFastDownloader:
             print(e.stderr.decode())
             raise
 
+    @staticmethod
+    def _select_segments(
+            manifest: HLSManifest,
+            num_frames: int | None = None,
+            timestamps: list[float] | None = None,
+    ) -> list[HLSSegment]:
+        """
+        Выбор сегментов, содержащих заданные моменты времени.
+
+        Args:
+            manifest (HLSManifest): Разобранный манифест
+            num_frames (int | None): Количество равномерно распределенных по видео моментов времени
+                (используется, если не заданы `timestamps`)
+            timestamps (list[float] | None): Моменты времени в секундах от начала видео
+
+        Returns:
+            (list[HLSSegment]): Сегменты без повторений в порядке следования в плейлисте
+
+        Raises:
+            ValueError: Если не заданы `timestamps`, а `num_frames` меньше 1
+        """
+        if timestamps is None:
+            if num_frames is None or num_frames < 1:
+                raise ValueError(f"num_frames must be >= 1 for partial download, got {num_frames}")
+            timestamps = [(i + 0.5) * manifest.duration / num_frames for i in range(num_frames)]
+        starts = [segment.start for segment in manifest.segments]
+        selected = {}
+        for timestamp in timestamps:
+            # Сегмент, внутри которого находится момент времени (каждый сегмент HLS начинается с ключевого кадра)
+            idx = min(max(bisect.bisect_right(starts, timestamp) - 1, 0), len(starts) - 1)
+            selected[idx] = manifest.segments[idx]
+        return [selected[idx] for idx in sorted(selected)]
+
     @staticmethod
     def _translation_hash(
             id: str,
@@ -156,6 +406,18 @@ class KodikFastDownloader:
     ) -> str:
         return md5(str(id+id_type+translation_id+str(seria_num)+quality).encode('utf-8')).hexdigest()
 
+    @staticmethod
+    def sparse_segments_path(video_path: str | Path) -> Path:
+        """
+        Путь до описания сегментов видео частичной загрузки: список [начало в исходной серии, длительность]
+        в секундах для каждого сегмента в порядке следования в видео
+        """
+        return Path(video_path).with_suffix(".segments.json")
+
+    def _tmp_dir(self, hsh: str) -> Path:
+        """ Временная директория сегментов серии """
+        return Path(self.tmp_root, f"{hsh}.v{self.tmp_format_version}~")
+
     def fast_download(
             self,
             id: str,
@@ -167,6 +429,9 @@ class KodikFastDownloader:
             output_name: str = "output",
             fps: float | int | None = None,
             with_audio: bool = True,
+            num_frames: int | None = None,
+            timestamps: list[float] | None = None,
+            max_size: int | None = None,
     ) -> Path | None:
         """
         Быстрая загрузка видео с Kodik. Загрузка выполняется сегментами параллельно с последующим склеиванием для
@@ -178,12 +443,23 @@ class KodikFastDownloader:
             quality (str): Желаемое качество видео. Допустимы варианты: "480", "720", "1080"
             output_dir (str | Path | None): Директория для сохранения видео (None - во временной директории)
             output_name (str): Имя сохраняемого видео (без расширения)
-            fps (float | int | None): FPS выходного файла (None - автоматически)
+            fps (float | int | None): FPS выходного файла (None - автоматически). При частичной загрузке
+                не применяется - сегменты сохраняются с исходной частотой кадров
             with_audio (bool): Следует ли экспортировать вместе с аудио
+            num_frames (int | None): Частичная загрузка - скачиваются только сегменты, содержащие `num_frames`
+                равномерно распределенных по серии кадров (None - загрузка всей серии). Положение сегментов
+                в серии сохраняется рядом с видео (см. `sparse_segments_path`)
+            timestamps (list[float] | None): Частичная загрузка - скачиваются только сегменты, содержащие
+                заданные моменты времени в секундах (имеет приоритет над `num_frames`)
+            max_size (int | None): Максимальный размер большей стороны кадра сохраняемого видео - кадры уменьшаются
+                с сохранением пропорций при склеивании (None - исходное разрешение)
 
         Returns:
             save_path (Path | None): Путь до сохраненного видео. Если не удалось найти трансляции - None
         """
+        # Некорректное количество кадров проверим до обращения к Kodik
+        if timestamps is None and num_frames is not None and num_frames < 1:
+            raise ValueError(f"num_frames must be >= 1 for partial download, got {num_frames}")
         check_ffmpeg() # Проверка на досутпность ffmpeg из модуля subprocess
         hsh = self._translation_hash(
             id=id,
@@ -193,7 +469,7 @@ class KodikFastDownloader:
             quality=quality
         )
         # Путь для временного сохранения
-        tmp_dir = Path(self.tmp_root, f"{hsh}~")
+        tmp_dir = self._tmp_dir(hsh)
         tmp_dir.mkdir(parents=True, exist_ok=True)
         # Путь до выходного файла
         output_dir = Path(output_dir) if output_dir is not None else tmp_dir
@@ -203,55 +479,72 @@ class KodikFastDownloader:
             return output_path
 
         link = self._get_download_link(id, id_type, seria_num, translation_id)
-        manifest = self._get_url_data(f'https:{link}{quality}.mp4:hls:manifest.m3u8')
-        segments = self._get_segments(manifest, f'https:{link}')
-        thr = len(segments)
+        manifest = self._get_manifest(
+            self._get_url_data(f'{self.protocol}{link}{quality}.mp4:hls:manifest.m3u8'),
+            original_link=f'{self.protocol}{link}'
+        )
         # Если не найдено сегментов
-        if not thr:
+        if not manifest.segments:
             return None
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            tasks = {}
-            for i in range(thr):
-                segment_path = Path(tmp_dir, f'{segments[i][1]}.ts')
-                # Если сегмент скачен - пропустим
-                if os.path.exists(segment_path):
-                    continue
-                # Скачаем сегмент во временный файл
-                tmp_segment_path = segment_path.with_stem(f'{segment_path.stem}~')
-                tmp_segment_path.unlink(missing_ok=True)
-                future = executor.submit(
-                    self._download_segment,
-                    segments[i][0],
-                    tmp_segment_path,
-                    timeout=self.segment_timeout
-                )
-                tasks[future] = (tmp_segment_path, segment_path)
-            # Пройдёмся по всем запущенным задачам
-            for future in concurrent.futures.as_completed(tasks.keys(), timeout=2*len(segments)):
-                # Проверим результат на ошибки
-                future.result()
-                # Переименуем сегмент
-                tmp_segment_path, segment_path = tasks[future]
-                tmp_segment_path.rename(segment_path)
-        # Соединим сегменты
-        tmp_output_path = Path(tmp_dir, f"{output_name}~.mp4")
-        tmp_output_path.unlink(missing_ok=True)
-        try:
-            self._combine_segments(
-                tmp_dir,
-                output_path=tmp_output_path,
-                fps=fps,
-                with_audio=with_audio,
-            )
-        except Exception:
+        segments = manifest.segments
+        # Частичная загрузка - только сегменты с нужными кадрами
+        sparse = num_frames is not None or timestamps is not None
+        if sparse:
+            segments = self._select_segments(manifest, num_frames=num_frames, timestamps=timestamps)
+        with self._reserve_disk(segments, paths=[tmp_dir, output_path.parent]):
+            self._download_segments(segments, tmp_dir)
+            # Соединим сегменты
+            tmp_output_path = Path(tmp_dir, f"{output_name}~.mp4")
             tmp_output_path.unlink(missing_ok=True)
-            raise
+            try:
+                self._combine_segments(
+                    tmp_dir,
+                    output_path=tmp_output_path,
+                    # Короткие выбранные сегменты сохраняются со всеми кадрами - при низкой частоте кадров
+                    # от склеенного видео осталось бы лишь несколько кадров
+                    fps=None if sparse else fps,
+                    with_audio=with_audio,
+                    hwaccel=self.hwaccel,
+                    sequences=[segment.sequence for segment in segments],
+                    max_size=max_size,
+                )
+            except Exception:
+                tmp_output_path.unlink(missing_ok=True)
+                raise
         # Если успешно - переименуем в нужный файл
         output_path.parent.mkdir(parents=True, exist_ok=True)
+        # Для частичной загрузки сохраним положение выбранных сегментов в исходной серии (до видео - чтобы
+        # у сохранённого видео всегда было описание сегментов)
+        if sparse:
+            segments_path = self.sparse_segments_path(output_path)
+            tmp_segments_path = segments_path.with_name(f"{segments_path.name}~")
+            with open(tmp_segments_path, "w", encoding="utf-8") as f:
+                json.dump([[segment.start, segment.duration] for segment in segments], f)
+            tmp_segments_path.replace(segments_path)
         output_path = tmp_output_path.rename(output_path)
 
         return output_path
 
+    @contextmanager
+    def _reserve_disk(self, segments: list[HLSSegment], paths: list[Path]) -> Iterator[None]:
+        """ Резервирование места на диске под загрузку сегментов (если задан контроль свободного места) """
+        if self.disk_budget is None:
+            yield
+            return
+        # Для сегментов с диапазоном байт размер известен заранее, для остальных - оценивается по длительности
+        known_bytes = sum(segment.byte_length for segment in segments if segment.byte_length is not None)
+        unknown_duration = sum(segment.duration for segment in segments if segment.byte_length is None)
+        with self.disk_budget.reserve(
+                self.disk_budget.estimate(unknown_duration, known_bytes), paths=paths, track=paths[0]
+        ):
+            yield
+        # Уточним оценку битрейта по фактическому размеру сегментов
+        segment_paths = [Path(paths[0], f'{segment.sequence}.ts') for segment in segments]
+        self.disk_budget.update_bitrate(
+            sum(path.stat().st_size for path in segment_paths if path.exists()),
+            sum(segment.duration for segment, path in zip(segments, segment_paths) if path.exists()),
+        )
+
     def clear_title_cache(
             self,
             id: str,
@@ -269,5 +562,5 @@ class KodikFastDownloader:
             quality=quality
         )
         # Удалим папку аниме вместе с данными
-        tmp_dir = Path(self.tmp_root, f"{hsh}~")
+        tmp_dir = self._tmp_dir(hsh)
         shutil.rmtree(tmp_dir, ignore_errors=True)
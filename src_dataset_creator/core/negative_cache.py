@@ -0,0 +1,84 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+
+class NegativeResultCache:
+    """
+    Сохраняемый кеш аниме, для которых не удалось получить данные (нет доступной трансляции или видео).
+
+    Для каждого id хранится причина неудачи и количество попыток. Повторная попытка разрешается не раньше,
+    чем через `retry_after` часов, увеличивающихся экспоненциально с каждой неудачной попыткой.
+    """
+    def __init__(
+            self,
+            path: str | Path,
+            retry_after: float = 168,
+            backoff_factor: float = 2.0,
+            max_retry_after: float = 24 * 180,
+    ):
+        """
+        Args:
+            path (str | Path): Путь до файла кеша
+            retry_after (float): Время до повторной попытки после первой неудачи (в часах)
+            backoff_factor (float): Множитель времени до повторной попытки для каждой следующей неудачи
+            max_retry_after (float): Максимальное время до повторной попытки (в часах)
+        """
+        self.path = Path(path)
+        self.retry_after = retry_after
+        self.backoff_factor = backoff_factor
+        self.max_retry_after = max_retry_after
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    def _save(self):
+        # Сохраним данные во временный json и заменим им исходный
+        tmp_path = self.path.with_stem(f"{self.path.stem}~")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=4, ensure_ascii=False)
+        self.path.unlink(missing_ok=True)
+        tmp_path.rename(self.path)
+
+    def get(self, id: str) -> dict | None:
+        """ Запись о неудачных попытках для аниме (None - неудачных попыток не было) """
+        with self._lock:
+            return self._entries.get(str(id))
+
+    def should_skip(self, id: str) -> bool:
+        """ Следует ли пропустить аниме (время до повторной попытки ещё не прошло) """
+        entry = self.get(id)
+        return entry is not None and time.time() < entry["retry_at"]
+
+    def expired_ids(self) -> list[str]:
+        """ id аниме, для которых время до повторной попытки истекло """
+        now = time.time()
+        with self._lock:
+            return [id for id, entry in self._entries.items() if now >= entry["retry_at"]]
+
+    def add(self, id: str, reason: str):
+        """ Записать неудачную попытку получения данных об аниме """
+        with self._lock:
+            entry = self._entries.get(str(id), {"attempts": 0})
+            attempts = entry["attempts"] + 1
+            retry_after = min(self.retry_after * self.backoff_factor ** (attempts - 1), self.max_retry_after)
+            now = time.time()
+            self._entries[str(id)] = {
+                "reason": reason,
+                "attempts": attempts,
+                "last_attempt": now,
+                "retry_at": now + retry_after * 3600,
+            }
+            self._save()
+
+    def remove(self, id: str):
+        """ Удалить запись (данные об аниме успешно получены) """
+        with self._lock:
+            if self._entries.pop(str(id), None) is not None:
+                self._save()
+
+    def __len__(self):
+        return len(self._entries)
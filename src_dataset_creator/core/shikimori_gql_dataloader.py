@@ -1,7 +1,22 @@
+import json
 import logging
+import time
+from copy import deepcopy
+from hashlib import md5
+from pathlib import Path
 from typing import Any
 
 from gql import Client, gql
+from graphql import (
+    ArgumentNode,
+    DocumentNode,
+    FieldNode,
+    GraphQLError,
+    NameNode,
+    OperationDefinitionNode,
+    VariableDefinitionNode,
+    VariableNode,
+)
 from gql.transport.requests import RequestsHTTPTransport
 from gql.transport.requests import log as requests_logger
 
@@ -15,10 +30,28 @@ class ShikimoriGQLOnlineDataloader:
             headers: dict[str, str] | None = None,
             batch_size: int = 50,
             url = "https://shikimori.one/api/graphql",
+            schema_cache_dir: str | Path | None = "tmp/schema_cache",
+            schema_cache_ttl: float = 168,
+            pages_per_request: int = 1,
     ):
+        """
+        Args:
+            query (str): GraphQL запрос списка аниме с параметрами `$page` и `$limit`
+            headers (dict[str, str] | None): Заголовки запросов
+            batch_size (int): Количество аниме на странице
+            url (str): Ссылка на GraphQL API Shikimori
+            schema_cache_dir (str | Path | None): Директория кеша схемы API для проверки запроса
+                (None - схема загружается при каждом запуске)
+            schema_cache_ttl (float): Время жизни кеша схемы API (в часах)
+            pages_per_request (int): Количество страниц, получаемых одним HTTP запросом
+                (запрос дублируется для каждой страницы под своим псевдонимом)
+        """
         self.query = query
         self.batch_size = batch_size
         self.url = url
+        self.schema_cache_dir = Path(schema_cache_dir) if schema_cache_dir is not None else None
+        self.schema_cache_ttl = schema_cache_ttl
+        self.pages_per_request = pages_per_request
         self._headers = headers or {}
         # Необходимо для избежания ошибки 403 при получении данных от api
         if "User-Agent" not in self._headers:
@@ -26,18 +59,148 @@ class ShikimoriGQLOnlineDataloader:
 
         # Конвертируем строковый запрос в формат библиотеки
         query_document = gql(query)
+        # Запрос нескольких страниц за раз
+        self._multi_page_document = None
+        self._multi_page_fields: list[str] = []
+        if pages_per_request > 1:
+            self._multi_page_document, self._multi_page_fields = self._build_multi_page_document(
+                query_document, pages_per_request
+            )
+        # Кеш последней полученной группы страниц вида: номер первой страницы -> список ответов
+        self._pages_cache: tuple[int, list[dict[str, Any]]] | None = None
         # Проверим запрос
-        self._check_query(query_document)
+        self._check_query(query_document, *([self._multi_page_document] if self._multi_page_document else []))
         self._query_document = query_document
         # Получим клиент без валидации запроса (т.к. запрос не изменен со временем)
         self._client = self._get_client(with_schema_validation=False)
 
-    def _check_query(self, query_document):
-        """ Проверка валидности запроса """
-        # Проверим валидность запроса
+    @property
+    def _schema_cache_path(self) -> Path | None:
+        if self.schema_cache_dir is None:
+            return None
+        return self.schema_cache_dir / f"{md5(self.url.encode('utf-8')).hexdigest()}.json"
+
+    @staticmethod
+    def _schema_fingerprint(introspection: dict[str, Any]) -> str:
+        return md5(json.dumps(introspection, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _load_cached_introspection(self) -> dict[str, Any] | None:
+        """ Загрузка схемы API из кеша (None - если кеш отсутствует, устарел или повреждён) """
+        cache_path = self._schema_cache_path
+        if cache_path is None or not cache_path.exists():
+            return None
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache["url"] != self.url or time.time() - cache["fetched_at"] > self.schema_cache_ttl * 3600:
+                return None
+            if self._schema_fingerprint(cache["introspection"]) != cache["fingerprint"]:
+                return None
+        except (ValueError, KeyError, TypeError):
+            return None
+        return cache["introspection"]
+
+    def _fetch_introspection(self) -> dict[str, Any]:
+        """ Загрузка схемы API с сервера с сохранением в кеш """
         client = self._get_client(with_schema_validation=True)
         with client:
-            client.validate(query_document)
+            introspection = client.introspection
+        cache_path = self._schema_cache_path
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_cache_path = cache_path.with_stem(f"{cache_path.stem}~")
+            with open(tmp_cache_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "url": self.url,
+                        "fetched_at": time.time(),
+                        "fingerprint": self._schema_fingerprint(introspection),
+                        "introspection": introspection,
+                    },
+                    f
+                )
+            tmp_cache_path.replace(cache_path)
+        return introspection
+
+    @staticmethod
+    def _build_multi_page_document(
+            query_document: DocumentNode,
+            pages: int
+    ) -> tuple[DocumentNode, list[str]]:
+        """
+        Преобразование запроса одной страницы в запрос нескольких страниц.
+
+        Каждое поле верхнего уровня, использующее переменную `$page`, повторяется `pages` раз
+        под псевдонимами `<поле>_p<k>` с переменными `$page<k>`.
+
+        Returns:
+            (tuple[DocumentNode, list[str]]): Запрос нескольких страниц и имена полей с постраничными данными
+        """
+        document = deepcopy(query_document)
+        operation = next(
+            definition for definition in document.definitions
+            if isinstance(definition, OperationDefinitionNode)
+        )
+        page_definition = next(
+            definition for definition in operation.variable_definitions
+            if definition.variable.name.value == "page"
+        )
+
+        def _uses_page(field: FieldNode) -> bool:
+            return any(
+                isinstance(argument.value, VariableNode) and argument.value.name.value == "page"
+                for argument in field.arguments
+            )
+
+        selections = []
+        page_fields = []
+        for field in operation.selection_set.selections:
+            if not isinstance(field, FieldNode) or not _uses_page(field):
+                selections.append(field)
+                continue
+            field_name = (field.alias or field.name).value
+            page_fields.append(field_name)
+            for k in range(pages):
+                page_field = deepcopy(field)
+                page_field.alias = NameNode(value=f"{field_name}_p{k}")
+                page_field.arguments = tuple(
+                    ArgumentNode(name=argument.name, value=VariableNode(name=NameNode(value=f"page{k}")))
+                    if isinstance(argument.value, VariableNode) and argument.value.name.value == "page"
+                    else argument
+                    for argument in field.arguments
+                )
+                selections.append(page_field)
+        operation.selection_set.selections = tuple(selections)
+        operation.variable_definitions = tuple(
+            definition for definition in operation.variable_definitions if definition is not page_definition
+        ) + tuple(
+            VariableDefinitionNode(
+                variable=VariableNode(name=NameNode(value=f"page{k}")),
+                type=page_definition.type,
+                default_value=page_definition.default_value,
+                directives=(),
+            )
+            for k in range(pages)
+        )
+        return document, page_fields
+
+    def _check_query(self, *query_documents: DocumentNode):
+        """ Проверка валидности запросов """
+        # Проверим валидность запроса по схеме API (из кеша, если доступна)
+        introspection = self._load_cached_introspection()
+        if introspection is not None:
+            try:
+                client = Client(introspection=introspection)
+                for query_document in query_documents:
+                    client.validate(query_document)
+            except GraphQLError:
+                # Схема в кеше могла устареть - проверим по актуальной
+                introspection = None
+        if introspection is None:
+            introspection = self._fetch_introspection()
+            client = Client(introspection=introspection)
+            for query_document in query_documents:
+                client.validate(query_document)
         # Проверим наличие параметров в запросе
         variable_params = ["page", "limit"]
         for variable in variable_params:
@@ -68,6 +231,8 @@ class ShikimoriGQLOnlineDataloader:
             Для более подробного изучения формата ответа можно обратиться к сайту документации API:
             https://shikimori.one/api/doc/graphql
         """
+        if self._multi_page_document is not None:
+            return self._get_multi_page_item(item)
         result = self._client.execute(
             self._query_document,
             variable_values={
@@ -78,6 +243,32 @@ class ShikimoriGQLOnlineDataloader:
 
         return result
 
+    def _get_multi_page_item(self, item: int) -> dict[str, Any]:
+        """ Получение страницы из группы страниц, запрашиваемых одним запросом """
+        first_page = item - item % self.pages_per_request
+        if self._pages_cache is None or self._pages_cache[0] != first_page:
+            result = self._client.execute(
+                self._multi_page_document,
+                variable_values={
+                    **{f"page{k}": first_page + k + 1 for k in range(self.pages_per_request)},
+                    "limit": self.batch_size,
+                },
+            )
+            # Разделим ответ на ответы отдельных страниц
+            page_keys = {
+                f"{field_name}_p{k}" for field_name in self._multi_page_fields for k in range(self.pages_per_request)
+            }
+            common_result = {key: value for key, value in result.items() if key not in page_keys}
+            pages = [
+                {
+                    **{field_name: result[f"{field_name}_p{k}"] for field_name in self._multi_page_fields},
+                    **common_result
+                }
+                for k in range(self.pages_per_request)
+            ]
+            self._pages_cache = (first_page, pages)
+        return self._pages_cache[1][item - first_page]
+
     def __iter__(self):
         self._current_page = 0
         return self
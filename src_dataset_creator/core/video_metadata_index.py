@@ -0,0 +1,162 @@
+import concurrent.futures
+import json
+import subprocess
+from fractions import Fraction
+from pathlib import Path
+
+
+def probe_video(path: str | Path, ffprobe: str = "ffprobe", count_frames: bool = False) -> dict:
+    """
+    Получение метаданных видео с помощью ffprobe (без декодирования кадров).
+
+    Args:
+        path (str | Path): Путь до видео
+        ffprobe (str): Путь до исполняемого файла ffprobe
+        count_frames (bool): Подсчитывать ли количество кадров по пакетам видеопотока,
+            если контейнер не содержит его (медленнее - читается весь файл)
+
+    Returns:
+        (dict): Длительность (в секундах), количество кадров, разрешение, частота кадров и кодек видео
+    """
+    stream_entries = "codec_name,width,height,avg_frame_rate,nb_frames,duration"
+    command = [ffprobe, "-v", "error", "-select_streams", "v:0"]
+    if count_frames:
+        stream_entries += ",nb_read_packets"
+        command.append("-count_packets")
+    command += ["-show_entries", f"stream={stream_entries}:format=duration", "-of", "json", str(path)]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"ffprobe exited with code {result.returncode}")
+    probe = json.loads(result.stdout)
+    if not probe.get("streams"):
+        raise RuntimeError("No video stream found")
+    stream = probe["streams"][0]
+
+    fps = float(Fraction(stream["avg_frame_rate"])) if stream.get("avg_frame_rate", "0/0") != "0/0" else None
+    duration = float(probe.get("format", {}).get("duration") or stream.get("duration") or 0)
+    num_frames = stream.get("nb_frames") or stream.get("nb_read_packets")
+    if num_frames is None and fps is not None:
+        num_frames = round(duration * fps)
+    return {
+        "duration": duration,
+        "num_frames": int(num_frames) if num_frames is not None else None,
+        "width": stream.get("width"),
+        "height": stream.get("height"),
+        "fps": fps,
+        "codec": stream.get("codec_name"),
+        # Сообщения ffprobe об ошибках чтения (к прим. обрезанный файл) при успешном завершении
+        "warnings": result.stderr.strip() or None,
+    }
+
+
+def _probe_entry(path: Path, ffprobe: str, count_frames: bool) -> dict:
+    """ Запись индекса для видео (ошибки ffprobe сохраняются в записи, а не прерывают индексацию) """
+    try:
+        return {"error": None, **probe_video(path, ffprobe=ffprobe, count_frames=count_frames)}
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+class VideoMetadataIndex:
+    """
+    Сохраняемый индекс метаданных скачанных видео (`videos/<id>/*.mp4`).
+
+    Для каждого видео хранятся id аниме, размер и время изменения файла, а также метаданные ffprobe.
+    При обновлении индекса повторно обрабатываются только новые и изменённые (по размеру или времени изменения) файлы.
+    """
+    def __init__(self, dataset_root: str | Path, index_name: str = "video_metadata.json"):
+        """
+        Args:
+            dataset_root (str | Path): Путь до набора данных
+            index_name (str): Имя файла индекса в директории набора данных
+        """
+        self.dataset_root = Path(dataset_root)
+        self.path = self.dataset_root / index_name
+        self.entries: dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def _save(self):
+        # Сохраним данные во временный json и заменим им исходный
+        tmp_path = self.path.with_stem(f"{self.path.stem}~")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=4, ensure_ascii=False)
+        self.path.unlink(missing_ok=True)
+        tmp_path.rename(self.path)
+
+    def _is_actual(self, key: str, path: Path) -> bool:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        stat = path.stat()
+        return entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+
+    def update(
+            self,
+            num_workers: int | None = None,
+            ffprobe: str = "ffprobe",
+            count_frames: bool = False,
+    ) -> tuple[int, int]:
+        """
+        Обновление индекса по текущему содержимому директории `videos`.
+
+        Args:
+            num_workers (int | None): Количество процессов ffprobe (None - по количеству ядер)
+            ffprobe (str): Путь до исполняемого файла ffprobe
+            count_frames (bool): Подсчитывать ли количество кадров по пакетам видеопотока
+
+        Returns:
+            (tuple[int, int]): Количество обработанных и удалённых из индекса видео
+        """
+        video_paths = {
+            path.relative_to(self.dataset_root).as_posix(): path
+            for path in self.dataset_root.glob("videos/*/*.mp4")
+        }
+        # Удалим записи видео, которых больше нет
+        removed = [key for key in self.entries if key not in video_paths]
+        for key in removed:
+            del self.entries[key]
+
+        stale = {key: path for key, path in video_paths.items() if not self._is_actual(key, path)}
+        if stale:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+                futures = {
+                    executor.submit(_probe_entry, path, ffprobe, count_frames): key
+                    for key, path in stale.items()
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    key = futures[future]
+                    path = stale[key]
+                    stat = path.stat()
+                    self.entries[key] = {
+                        "id": path.parent.name,
+                        "size": stat.st_size,
+                        "mtime_ns": stat.st_mtime_ns,
+                        **future.result(),
+                    }
+        if stale or removed:
+            self._save()
+        return len(stale), len(removed)
+
+    def get(self, video_path: str | Path) -> dict | None:
+        """ Метаданные видео по пути относительно набора данных (None - видео нет в индексе) """
+        return self.entries.get(Path(video_path).as_posix())
+
+    def get_by_id(self, id: str) -> list[dict]:
+        """ Метаданные всех видео аниме """
+        return [entry for entry in self.entries.values() if entry["id"] == str(id)]
+
+    def invalid(self, min_duration: float = 0.0) -> dict[str, dict]:
+        """
+        Видео, которые не удалось прочитать, с ошибками чтения или короче `min_duration` секунд
+        (повреждённые или не до конца скачанные файлы)
+        """
+        return {
+            key: entry for key, entry in self.entries.items()
+            if entry["error"] is not None or entry["warnings"] is not None
+            or not entry["num_frames"] or entry["duration"] < min_duration
+        }
+
+    def __len__(self):
+        return len(self.entries)
@@ -1,5 +1,5 @@
 from typing import Any
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from datetime import datetime
 
 
@@ -17,6 +17,15 @@ class AnimeData:
     popularity: int
     description: str
     video_path: str
+    video_resolution: list[int] | None = field(default=None, kw_only=True)
+    """ Разрешение сохраненного видео [ширина, высота] (None - неизвестно) """
+    frame_timestamps: list[float] | None = field(default=None, kw_only=True)
+    """ Время кадров видео (в секундах), выбранных по смене сцен (None - равномерный выбор кадров) """
+    sparse_segments: list[list[float]] | None = field(default=None, kw_only=True)
+    """
+    Частичная загрузка: сегменты исходной серии, из которых склеено видео, [начало, длительность] в секундах
+    (None - видео содержит всю серию)
+    """
 
     def to_json(self) -> dict[str, Any]:
         data = asdict(self)
@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# Модули набора данных импортируются от корня модуля (как при запуске `python -m tools.<name>`)
+ROOT = Path(__file__).parents[1]
+sys.path.insert(0, str(ROOT))
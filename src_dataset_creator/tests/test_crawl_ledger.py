@@ -0,0 +1,65 @@
+import multiprocessing
+import time
+
+import pytest
+
+from core.crawl_ledger import CrawlLedger
+
+NUM_PAGES = 30
+
+
+def _crawl(path: str, worker_id: str, queue: multiprocessing.Queue):
+    """ Обработчик: захватывает страницы до конца журнала и сообщает номера обработанных страниц """
+    ledger = CrawlLedger(path, worker_id=worker_id, lease_seconds=60, poll_interval=0.01)
+    pages = []
+    while (page := ledger.claim_page()) is not None:
+        if page >= NUM_PAGES:
+            ledger.mark_end(page)
+            continue
+        # Имитация обработки страницы
+        time.sleep(0.002)
+        pages.append(page)
+        ledger.complete(page)
+    ledger.close()
+    queue.put((worker_id, pages))
+
+
+def test_workers_never_process_same_page(tmp_path):
+    path = str(tmp_path / "crawl_ledger.sqlite")
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    workers = [
+        context.Process(target=_crawl, args=(path, f"worker-{i}", queue))
+        for i in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    results = dict(queue.get(timeout=60) for _ in workers)
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    pages = [page for worker_pages in results.values() for page in worker_pages]
+    assert len(pages) == len(set(pages))
+    assert sorted(pages) == list(range(NUM_PAGES))
+
+
+def test_restarted_worker_reclaims_own_pages(tmp_path):
+    path = tmp_path / "crawl_ledger.sqlite"
+    ledger = CrawlLedger(path, worker_id="worker-1", lease_seconds=3600)
+    page = ledger.claim_page()
+    ledger.close()
+
+    # Другой обработчик не получает страницу до истечения аренды, а перезапущенный - получает сразу
+    other = CrawlLedger(path, worker_id="worker-2", lease_seconds=3600)
+    assert other.claim_page() != page
+    restarted = CrawlLedger(path, worker_id="worker-1", lease_seconds=3600)
+    assert restarted.claim_page() == page
+    other.close()
+    restarted.close()
+
+
+@pytest.mark.parametrize("worker_id", [None, "", "host/1"])
+def test_worker_id_is_required(tmp_path, worker_id):
+    with pytest.raises(ValueError):
+        CrawlLedger(tmp_path / "crawl_ledger.sqlite", worker_id=worker_id)
@@ -0,0 +1,32 @@
+import json
+import subprocess
+import sys
+
+import pytest
+
+from tools.benchmark_import_time import DEFAULT_FORBIDDEN, DEFAULT_MODULES, ROOT
+
+
+def _module_params():
+    for module in DEFAULT_MODULES:
+        try:
+            source = (ROOT / f"{module.replace('.', '/')}.py").read_text(encoding="utf-8")
+            compile(source, module, "exec")
+        except SyntaxError:
+            # Синтаксис модуля требует более новой версии интерпретатора (к прим. f-строки python 3.12)
+            yield pytest.param(module, marks=pytest.mark.skip(reason=f"'{module}' requires newer python"))
+        else:
+            yield module
+
+
+@pytest.mark.parametrize("module", list(_module_params()))
+def test_entry_point_does_not_import_heavy_modules(module):
+    """ Импорт точки входа в чистом процессе не должен загружать тяжелые пакеты """
+    code = f"import json, sys; import {module}; print(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+    modules = json.loads(result.stdout)
+    assert module in modules
+    loaded_forbidden = sorted({name.split(".")[0] for name in modules} & set(DEFAULT_FORBIDDEN))
+    assert loaded_forbidden == []
@@ -0,0 +1,100 @@
+import pytest
+from gql import Client
+from gql.transport import Transport
+from graphql import build_schema, execute_sync, get_introspection_query, graphql_sync
+
+from core.shikimori_gql_dataloader import ShikimoriGQLOnlineDataloader
+
+SCHEMA = build_schema("""
+    scalar PositiveInt
+
+    type Anime {
+        id: ID!
+        name: String!
+    }
+
+    type Query {
+        animes(page: PositiveInt, limit: PositiveInt, order: String): [Anime!]!
+        currentUser: String
+    }
+""")
+
+QUERY = """
+query getAnimeList($page: PositiveInt, $limit: PositiveInt) {
+    animes(page: $page, limit: $limit, order: "popularity") {
+        id
+        name
+    }
+    currentUser
+}
+"""
+
+# 23 аниме при 5 на странице: 4 полные страницы, неполная пятая и пустые после неё
+ANIMES = [{"id": str(i), "name": f"Anime {i}"} for i in range(23)]
+BATCH_SIZE = 5
+
+
+def _resolve_animes(info, page: int = 1, limit: int = 50, **kwargs):
+    return ANIMES[(page - 1) * limit:page * limit]
+
+
+class StubTransport(Transport):
+    """ Локальное выполнение запросов по схеме-заглушке API с подсчётом HTTP запросов """
+    def __init__(self):
+        self.requests = 0
+
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def execute(self, document, variable_values=None, operation_name=None, **kwargs):
+        self.requests += 1
+        return execute_sync(
+            SCHEMA,
+            document,
+            root_value={"animes": _resolve_animes, "currentUser": "stub"},
+            variable_values=variable_values,
+            operation_name=operation_name,
+        )
+
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    transports = []
+
+    def _get_client(self, with_schema_validation: bool = True):
+        transports.append(StubTransport())
+        return Client(transport=transports[-1], schema=SCHEMA, parse_results=True)
+
+    introspection = graphql_sync(SCHEMA, get_introspection_query()).data
+    monkeypatch.setattr(ShikimoriGQLOnlineDataloader, "_get_client", _get_client)
+    monkeypatch.setattr(ShikimoriGQLOnlineDataloader, "_fetch_introspection", lambda self: introspection)
+    return transports
+
+
+def _fetch_pages(dataloader: ShikimoriGQLOnlineDataloader, num_pages: int) -> list[dict]:
+    return [dataloader[page] for page in range(num_pages)]
+
+
+@pytest.mark.parametrize("pages_per_request", [2, 3, 7])
+def test_multi_page_requests_match_single_page_requests(stub_api, pages_per_request):
+    num_pages = 7
+    single = ShikimoriGQLOnlineDataloader(QUERY, batch_size=BATCH_SIZE, schema_cache_dir=None)
+    multi = ShikimoriGQLOnlineDataloader(
+        QUERY, batch_size=BATCH_SIZE, schema_cache_dir=None, pages_per_request=pages_per_request
+    )
+    single_pages = _fetch_pages(single, num_pages)
+    multi_pages = _fetch_pages(multi, num_pages)
+
+    assert multi_pages == single_pages
+    # Неполная последняя страница и пустые страницы после неё
+    assert [len(page["animes"]) for page in multi_pages] == [5, 5, 5, 5, 3, 0, 0]
+    assert [anime["id"] for page in multi_pages for anime in page["animes"]] == [anime["id"] for anime in ANIMES]
+    # Поля без `$page` возвращаются для каждой страницы
+    assert all(page["currentUser"] == "stub" for page in multi_pages)
+    # Одним запросом получается `pages_per_request` страниц
+    assert stub_api[0].requests == num_pages
+    assert stub_api[1].requests == -(-num_pages // pages_per_request)
+
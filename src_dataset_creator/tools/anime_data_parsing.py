@@ -1,30 +1,39 @@
+from __future__ import annotations
+
 import concurrent.futures
 import datetime
 import json
 import logging
-import os
 import time
 import re
 from dataclasses import asdict
-from logging import exception
 from pathlib import Path
-from typing import Any
+from typing import Any, TYPE_CHECKING
 
-import hydra
-from accelerate.commands.config.update import description
 from tqdm.auto import tqdm
 
 from core.logger import LoggerFactory
-from core.shikimori_gql_dataloader import ShikimoriGQLOnlineDataloader
-from core.mal_data_grabber import MALAnimeDataGrabber
-from core.kodik_fast_downloader import KodikFastDownloader, TranslationEnum
-from core.anime_filters import AbstractAnimeFilter
+from core.crawl_cursor import CrawlCursor
+from core.negative_cache import NegativeResultCache
 from models import AnimeData, ExtendedAnimeData, RelatedAnimeData
 
+# Клиенты API и загрузчик импортируются только для аннотаций типов: их модули (gql, requests, anime_parsers_ru)
+# загружаются при создании объектов из конфигурации, а не при импорте модуля
+if TYPE_CHECKING:
+    from core.shikimori_gql_dataloader import ShikimoriGQLOnlineDataloader
+    from core.mal_data_grabber import MALAnimeDataGrabber
+    from core.kodik_fast_downloader import KodikFastDownloader
+    from core.anime_filters import AbstractAnimeFilter
+    from core.crawl_ledger import CrawlLedger
+
 ROOT = Path(__file__).parents[1]
 MAIN_LOGGER = logging.getLogger()
 
 
+class NoAvailableVideoError(RuntimeError):
+    """ Для аниме нет доступной для загрузки видеозаписи """
+
+
 def parse_shikimori_anime_data(
         data: dict[str, Any],
         with_extended_data: bool = True
@@ -137,8 +146,15 @@ def expansion_anime_data_from_kodik(
         fps: int | float | None = None,
         with_audio: bool = False,
         quality: str = "720",
+        sparse_frames: int | None = None,
+        video_max_size: int | None = None,
+        scene_frames: int | None = None,
 ) -> AnimeData:
     """ Скачивание первой серии аниме с Kodik """
+    from core.kodik_fast_downloader import TranslationEnum
+    from core.video_metadata_index import probe_video
+    from core.frame_selection import select_scene_timestamps
+
     # Сформируем путь для сохранения видео
     if not save_path.exists():
         # Получим допустимые трансляции и выберем первую (первые в списке - озвучки, с которых удалится аудио)
@@ -149,7 +165,7 @@ def expansion_anime_data_from_kodik(
         # Получим только трансляции с озвучкой, чтобы не было текста на экране
         available_translation = [tr for tr in available_translation if tr.type == TranslationEnum.DUB]
         if not available_translation:
-            raise RuntimeError(f"No found available sub translations for {data.name} with id {data.id}")
+            raise NoAvailableVideoError(f"No found available sub translations for {data.name} with id {data.id}")
         translation_id = available_translation[0].id
         retries = 0
         kodik_save_path = None
@@ -166,7 +182,9 @@ def expansion_anime_data_from_kodik(
                     output_dir=save_path.parent,
                     output_name=save_path.stem,
                     fps=fps,
-                    with_audio=with_audio
+                    with_audio=with_audio,
+                    num_frames=sparse_frames,
+                    max_size=video_max_size,
                 )
             except Exception as e:
                 if retries < 2:
@@ -208,10 +226,27 @@ def expansion_anime_data_from_kodik(
 
         # Если все равно не удалось найти
         if kodik_save_path is None:
-            raise RuntimeError(f"No found downloadable translation for {data.name} with id {data.id}")
+            raise NoAvailableVideoError(f"No found downloadable translation for {data.name} with id {data.id}")
         save_path = kodik_save_path
 
     data.video_path = save_path.as_posix()
+    # Положение сегментов частичной загрузки в исходной серии
+    sparse_segments_path = kodik_downloader.sparse_segments_path(save_path)
+    if sparse_segments_path.exists():
+        with open(sparse_segments_path, "r", encoding="utf-8") as f:
+            data.sparse_segments = json.load(f)
+    # Сохраним фактическое разрешение видео (для проверки соответствия настройкам обработчика модели)
+    try:
+        video_metadata = probe_video(save_path)
+        data.video_resolution = [video_metadata["width"], video_metadata["height"]]
+    except Exception as e:
+        MAIN_LOGGER.warning(f"Cannot get video resolution for {data.name} with id {data.id}. Reason: {type(e)}: {e}")
+    # Выберем кадры по смене сцен (без них набор данных использует равномерно распределенные кадры)
+    if scene_frames is not None:
+        try:
+            data.frame_timestamps = select_scene_timestamps(save_path, num_frames=scene_frames)
+        except Exception as e:
+            MAIN_LOGGER.warning(f"Cannot select scene frames for {data.name} with id {data.id}. Reason: {type(e)}: {e}")
 
     return data
 
@@ -229,6 +264,11 @@ def main(
         num_workers: int = 1,
         update_annotation: bool = False,
         video_download_timeout: int = 180,
+        sparse_frames: int | None = None,
+        video_max_size: int | None = None,
+        scene_frames: int | None = None,
+        crawl_ledger: CrawlLedger | None = None,
+        negative_cache_retry_after: float | None = 168,
 ):
     save_root: Path = Path(save_root)
     save_root.mkdir(parents=True, exist_ok=True)
@@ -241,6 +281,10 @@ def main(
     parsed_anime_ids: set[str] = set()
 
     annotation_path = Path(save_root / "annotation.json")
+    # При распределенном сборе каждый обработчик записывает собственную часть аннотации
+    # (объединение частей - tools/merge_annotation_shards.py)
+    if crawl_ledger is not None:
+        annotation_path = Path(save_root / f"annotation.{crawl_ledger.worker_id}.json")
     # Если файл анатации уже существует
     if annotation_path.exists():
         if update_annotation:
@@ -255,9 +299,43 @@ def main(
         else:
             raise FileExistsError(f"Annotation file by path '{annotation_path}' already exists")
 
+    # Кеш аниме без доступного видео - такие аниме пропускаются до истечения времени повторной попытки
+    negative_cache = None
+    if negative_cache_retry_after is not None:
+        negative_cache = NegativeResultCache(
+            annotation_path.with_name(annotation_path.name.replace("annotation", "negative_cache", 1)),
+            retry_after=negative_cache_retry_after,
+        )
+        MAIN_LOGGER.info(f"Loaded {len(negative_cache)} titles without available video.")
+
+    # Состояние обхода страниц Shikimori (при распределенном сборе страницы выдаются общим журналом)
+    crawl_cursor = None
     current_batch = 0
+    if crawl_ledger is None:
+        crawl_cursor = CrawlCursor(
+            save_root / "crawl_cursor.json",
+            query=shiki_dataset.query,
+            batch_size=shiki_dataset.batch_size
+        )
+        # Новый сбор данных начинается с первой страницы
+        if not annotation_path.exists():
+            crawl_cursor.reset()
+        # Страницы с аниме, время повторной попытки для которых истекло, обрабатываются заново
+        if negative_cache is not None:
+            retry_pages = crawl_cursor.reopen_pages(negative_cache.expired_ids())
+            if retry_pages:
+                MAIN_LOGGER.info(f"Retry {len(retry_pages)} Shikimori pages with titles without available video.")
+        current_batch = crawl_cursor.next_page()
+        if current_batch > 0:
+            MAIN_LOGGER.info(f"Resume crawling from Shikimori page {current_batch + 1}.")
     pbar = tqdm(initial=len(parsed_anime_ids), ncols=90, desc = "Start parsing...", unit="titles")
     while True:
+        # При распределенном сборе страница выдаётся общим журналом
+        if crawl_ledger is not None:
+            current_batch = crawl_ledger.claim_page()
+            if current_batch is None:
+                MAIN_LOGGER.info("All Shikimori pages are processed by workers.")
+                break
         pbar.set_description(f"Querying data from Shikimori...")
         shiki_retries = 0
         try:
@@ -266,8 +344,13 @@ def main(
             # Если нет данных - закончились страницы
             if len(shiki_data_batch) == 0:
                 MAIN_LOGGER.info("Research end of Shikimori dataset.")
+                if crawl_ledger is not None:
+                    crawl_ledger.mark_end(current_batch)
+                    continue
                 break
         except Exception as e:
+            if crawl_ledger is not None:
+                crawl_ledger.release(current_batch)
             if shiki_retries > 5:
                 raise
             MAIN_LOGGER.warning(
@@ -277,6 +360,10 @@ def main(
             time.sleep(1)
             continue
 
+        # Запомним id аниме страницы для сохранения состояния обхода
+        page_anime_ids = [str(data["id"]) for data in shiki_data_batch]
+        # Страница обработана полностью, если все аниме сохранены, отброшены фильтрами или записаны в кеш без видео
+        page_finished = True
         # Отфильтруем аниме, для которых уже известны данные
         shiki_data_batch = [data for data in shiki_data_batch if str(data["id"]) not in parsed_anime_ids]
         # Распарсим данные
@@ -310,6 +397,13 @@ def main(
             # Добавим данные аниме в список для дальнейшего использования
             anime_data_batch.append(anime_data)
 
+        # Пропустим аниме, для которых недавно не удалось найти видео
+        if negative_cache is not None:
+            skipped_anime_data = [data for data in anime_data_batch if negative_cache.should_skip(data.id)]
+            if skipped_anime_data:
+                MAIN_LOGGER.debug(f"Skip {len(skipped_anime_data)} titles without available video")
+                anime_data_batch = [data for data in anime_data_batch if not negative_cache.should_skip(data.id)]
+
         def _expansion_anime_data(data: AnimeData) -> AnimeData:
             """ Объединим несколько расширителей данных в единый конвеер для запуска в параллельных потоках """
             safety_name = re.sub(r'[\\/:"*?<>|.,]+', "", data.name)
@@ -331,9 +425,14 @@ def main(
                 fps=fps,
                 with_audio=with_audio,
                 quality=quality,
+                sparse_frames=sparse_frames,
+                video_max_size=video_max_size,
+                scene_frames=scene_frames,
             )
             return data
 
+        if crawl_ledger is not None:
+            crawl_ledger.renew(current_batch)
         pbar.set_description(f"Wait external data from extra source...")
         with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
             # Запустим обработку всех данных в отдельных потоках
@@ -353,6 +452,11 @@ def main(
                         MAIN_LOGGER.warning(
                             f"Cannot get external data for {future_data.name} with id {future_data.id}. Reason: {type(e)}: {e}"
                         )
+                        # Аниме без видео записывается в кеш, повторная попытка будет выполнена по кешу
+                        if negative_cache is not None and isinstance(e, NoAvailableVideoError):
+                            negative_cache.add(future_data.id, reason=str(e))
+                        else:
+                            page_finished = False
                         continue
 
                     # Сделаем путь до файла видео относительным
@@ -361,6 +465,8 @@ def main(
                     )
                     # Добавим сохраненное аниме в список
                     parsed_anime_ids.add(anime_data.id)
+                    if negative_cache is not None:
+                        negative_cache.remove(anime_data.id)
                     # Сохраним данные об аниме
                     anime_dataset["animes"].append(anime_data.to_json())
                     # Сохраним данные во временный json
@@ -373,10 +479,23 @@ def main(
 
                     pbar.set_description(f"Save {anime_data.name:20} (id {anime_data.id})...")
                     pbar.update(1)
-            except TimeoutError as e:
-                MAIN_LOGGER.warning(f'Several anime was dropped by preparing timeout')
+                    if crawl_ledger is not None:
+                        crawl_ledger.renew(current_batch)
+            except TimeoutError:
+                MAIN_LOGGER.warning('Several anime was dropped by preparing timeout')
+                page_finished = False
         # Засчитаем успешность обработки партии
-        current_batch += 1
+        if crawl_ledger is not None:
+            if page_finished:
+                crawl_ledger.complete(current_batch)
+            else:
+                # Аренда незавершенной страницы не продлевается - после её истечения страница будет обработана повторно
+                MAIN_LOGGER.warning(
+                    f"Shikimori page {current_batch + 1} is not fully processed and will be retried after lease expiration."
+                )
+        else:
+            crawl_cursor.update_page(current_batch, ids=page_anime_ids, finished=page_finished)
+            current_batch = crawl_cursor.next_page(after=current_batch)
         # Если собрано достаточно данных - завершим
         if max_samples and len(parsed_anime_ids) > max_samples:
             MAIN_LOGGER.info("Stop parsing after reaching the `max_samples` threshold.")
@@ -384,6 +503,29 @@ def main(
     pbar.close()
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Collect anime dataset from Shikimori, MyAnimeList and Kodik")
+    parser.add_argument("--config-name", default="anime_data_parsing", help="Config name in data/config")
+    parser.add_argument("--dry-run", action="store_true", help="Print composed config and exit")
+    parser.add_argument("overrides", nargs="*", help="Hydra config overrides (e.g. max_samples=10)")
+    args = parser.parse_args()
+
+    # hydra загружается только при фактическом запуске (--help не требует её импорта)
+    import hydra
+    from omegaconf import OmegaConf
+
+    # Загрузим словарь конфигурации API
+    config_dir = Path(ROOT, "data", "config").absolute()
+    with hydra.initialize_config_dir(
+            config_dir=str(config_dir),
+            version_base=None
+    ):
+        api_config = hydra.compose(config_name=args.config_name, overrides=args.overrides)
+    if args.dry_run:
+        print(OmegaConf.to_yaml(api_config))
+        raise SystemExit(0)
+
     # Найстроим логирование
     LOG_FILE = Path(ROOT, 'logs' , f'{Path(__file__).stem}.txt')
     LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
@@ -395,13 +537,6 @@ if __name__ == "__main__":
         log_file=LOG_FILE,
     )
     MAIN_LOGGER = LoggerFactory.get_logger(Path(__file__).stem.capitalize())
-    # Загрузим словарь конфигурации API
-    config_dir = Path(ROOT, "data", "config").absolute()
-    with hydra.initialize_config_dir(
-            config_dir=str(config_dir),
-            version_base=None
-    ):
-        api_config = hydra.compose(config_name="anime_data_parsing")
     # Инициализируем данные из конфигурации
     api_config = hydra.utils.instantiate(api_config)
     # Запустим главный цикл обработки
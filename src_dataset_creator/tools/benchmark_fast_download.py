@@ -0,0 +1,280 @@
+"""
+Воспроизводимый offline бенчмарк `KodikFastDownloader.fast_download`.
+
+Поднимает локальный сервер, имитирующий CDN Kodik (m3u8 манифест и синтетические `.ts` сегменты)
+с настраиваемыми задержкой, пропускной способностью и долей ошибок, и выполняет полную загрузку серии
+со склеиванием сегментов через ffmpeg.
+
+Пример запуска:
+    python -m tools.benchmark_fast_download --segments 120 --latency 50 --bandwidth 20 --repeats 3
+"""
+import argparse
+import json
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+from core.kodik_fast_downloader import KodikFastDownloader
+
+
+def generate_segments(directory: Path, num_segments: int, segment_duration: float, resolution: str):
+    """ Генерация синтетических HLS сегментов с помощью ffmpeg """
+    directory.mkdir(parents=True, exist_ok=True)
+    subprocess.run(
+        [
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'lavfi', '-i', f'testsrc2=size={resolution}:rate=24',
+            '-t', str(num_segments * segment_duration),
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-g', str(int(24 * segment_duration)),
+            '-f', 'hls', '-hls_time', str(segment_duration), '-hls_list_size', '0',
+            '-hls_segment_filename', str(directory / 'seg-%d-v1-a1.ts'),
+            str(directory / 'manifest.m3u8')
+        ],
+        check=True
+    )
+    # Ссылки на сегменты в манифестах Kodik имеют вид "./<quality>.mp4:hls:seg-<N>-v1-a1.ts"
+    manifest_path = directory / 'manifest.m3u8'
+    manifest = manifest_path.read_text().splitlines()
+    manifest = [f'./720.mp4:hls:{line}' if line.endswith('.ts') else line for line in manifest]
+    manifest_path.write_text('\n'.join(manifest) + '\n')
+
+
+class FakeKodikServer:
+    """ Локальный HTTP сервер, раздающий манифест и сегменты из директории """
+    def __init__(self, directory: Path, latency: float = 0.0, bandwidth: float | None = None, error_rate: float = 0.0):
+        """
+        Args:
+            directory (Path): Директория с `manifest.m3u8` и сегментами
+            latency (float): Задержка перед ответом в секундах
+            bandwidth (float | None): Пропускная способность одного соединения в байтах/сек (None - без ограничения)
+            error_rate (float): Доля запросов сегментов, завершающихся ошибкой 503
+        """
+        self.directory = directory
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.requests = 0
+        self._random = random.Random(0)
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def link(self) -> str:
+        """ Ссылка на видео в формате Kodik (без протокола) """
+        return f'//127.0.0.1:{self._httpd.server_port}/video/'
+
+    def _handle(self, handler: BaseHTTPRequestHandler):
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+        time.sleep(self.latency)
+        # Манифест запрашивается как "<quality>.mp4:hls:manifest.m3u8", сегменты - "<quality>.mp4:hls:seg-*.ts"
+        name = handler.path.rsplit('/', 1)[-1].rsplit(':', 1)[-1]
+        path = self.directory / name
+        if not path.is_file():
+            handler.send_error(404)
+            return
+        if failed and path.suffix == '.ts':
+            handler.send_error(503)
+            return
+        data = path.read_bytes()
+        handler.send_response(200)
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        chunk_size = 64 * 1024
+        for start in range(0, len(data), chunk_size):
+            handler.wfile.write(data[start:start + chunk_size])
+            if self.bandwidth:
+                time.sleep(chunk_size / self.bandwidth)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class BenchmarkKodikFastDownloader(KodikFastDownloader):
+    """ Загрузчик, получающий видео с локального сервера и замеряющий время этапов загрузки """
+    protocol = 'http:'
+
+    def __init__(self, link: str, **kwargs):
+        super().__init__(kodik_token='offline', **kwargs)
+        self._link = link
+        self.timings = {'download': 0.0, 'combine': 0.0}
+        # Количество и размер фактически скачанных сегментов (при `num_frames` скачивается только часть манифеста)
+        self.downloaded = {'segments': 0, 'bytes': 0}
+
+    def _get_download_link(self, id: str, id_type: str, seria_num: int, translation_id: str):
+        return self._link
+
+    def _download_segments(self, segments: list, tmp_dir: Path):
+        start = time.perf_counter()
+        try:
+            return super()._download_segments(segments, tmp_dir)
+        finally:
+            self.timings['download'] += time.perf_counter() - start
+            for segment in segments:
+                segment_path = Path(tmp_dir, f'{segment.sequence}.ts')
+                if segment_path.exists():
+                    self.downloaded['segments'] += 1
+                    self.downloaded['bytes'] += segment_path.stat().st_size
+
+    def _combine_segments(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super()._combine_segments(*args, **kwargs)
+        finally:
+            self.timings['combine'] += time.perf_counter() - start
+
+
+def _peak_rss_mb() -> dict[str, float]:
+    # ru_maxrss в Linux задаётся в килобайтах
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def run_benchmark(
+        work_dir: Path,
+        server: FakeKodikServer,
+        repeats: int = 3,
+        fps: float | None = None,
+        num_frames: int | None = None,
+        hedge_quantile: float | None = 0.95,
+) -> dict:
+    runs = []
+    for repeat in range(repeats):
+        downloader = BenchmarkKodikFastDownloader(
+            server.link,
+            tmp_root=work_dir / 'tmp',
+            hedge_quantile=hedge_quantile,
+            hwaccel=None,
+        )
+        start = time.perf_counter()
+        error = None
+        try:
+            downloader.fast_download(
+                id='0', id_type='shikimori', seria_num=1, translation_id='0', quality='720',
+                output_dir=work_dir / 'videos', output_name=f'output_{repeat}',
+                fps=fps, with_audio=False, num_frames=num_frames,
+            )
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        elapsed = time.perf_counter() - start
+        downloader.clear_title_cache(id='0', id_type='shikimori', seria_num=1, translation_id='0', quality='720')
+        runs.append({
+            'elapsed': elapsed,
+            'download': downloader.timings['download'],
+            'combine': downloader.timings['combine'],
+            'segments': downloader.downloaded['segments'],
+            'total_mb': downloader.downloaded['bytes'] / 2 ** 20,
+            'error': error,
+        })
+    ok_runs = [run for run in runs if run['error'] is None]
+
+    def _median(key: str) -> float | None:
+        # Без успешных запусков скорость не определена
+        return statistics.median(run[key] for run in ok_runs) if ok_runs else None
+
+    download = _median('download')
+    segments = _median('segments')
+    total_mb = _median('total_mb')
+    return {
+        'segments': segments,
+        'total_mb': total_mb,
+        'runs': runs,
+        'failed_runs': len(runs) - len(ok_runs),
+        'median_elapsed': _median('elapsed'),
+        'median_download': download,
+        'median_combine': _median('combine'),
+        'segments_per_sec': segments / download if download else None,
+        'mb_per_sec': total_mb / download if download else None,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of KodikFastDownloader.fast_download")
+    parser.add_argument('--segments', type=int, default=60, help='Number of synthetic segments')
+    parser.add_argument('--segment-duration', type=float, default=6.0, help='Segment duration in seconds')
+    parser.add_argument('--resolution', default='1280x720', help='Synthetic video resolution')
+    parser.add_argument('--latency', type=float, default=0.0, help='Server response latency in milliseconds')
+    parser.add_argument('--bandwidth', type=float, default=None, help='Per-connection bandwidth in MB/s')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of failed segment requests')
+    parser.add_argument('--repeats', type=int, default=3, help='Number of benchmark runs')
+    parser.add_argument('--fps', type=float, default=None, help='Output fps (None - stream copy)')
+    parser.add_argument('--num-frames', type=int, default=None, help='Sparse download frame count')
+    parser.add_argument('--no-hedge', action='store_true', help='Disable hedged segment requests')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], default=None, help='Profile the runs')
+    parser.add_argument('--profile-output', default='fast_download.prof', help='Profiler output path')
+    parser.add_argument('--output', default=None, help='Path to save JSON report (default - stdout)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        generate_segments(work_dir / 'cdn', args.segments, args.segment_duration, args.resolution)
+        with FakeKodikServer(
+                work_dir / 'cdn',
+                latency=args.latency / 1000,
+                bandwidth=args.bandwidth * 2 ** 20 if args.bandwidth else None,
+                error_rate=args.error_rate,
+        ) as server:
+            benchmark_kwargs = dict(
+                work_dir=work_dir,
+                server=server,
+                repeats=args.repeats,
+                fps=args.fps,
+                num_frames=args.num_frames,
+                hedge_quantile=None if args.no_hedge else 0.95,
+            )
+            if args.profile == 'cprofile':
+                import cProfile
+                profiler = cProfile.Profile()
+                report = profiler.runcall(run_benchmark, **benchmark_kwargs)
+                profiler.dump_stats(args.profile_output)
+            elif args.profile == 'pyinstrument':
+                from pyinstrument import Profiler
+                profiler = Profiler()
+                with profiler:
+                    report = run_benchmark(**benchmark_kwargs)
+                Path(args.profile_output).write_text(profiler.output_html(), encoding='utf-8')
+            else:
+                report = run_benchmark(**benchmark_kwargs)
+            report['server_requests'] = server.requests
+    report['params'] = vars(args)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=4), encoding='utf-8')
+    else:
+        json.dump(report, sys.stdout, indent=4)
+        print()
+    # Все запуски завершились ошибкой - результат бенчмарка недействителен
+    if report['failed_runs'] == len(report['runs']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
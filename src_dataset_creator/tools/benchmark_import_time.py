@@ -0,0 +1,129 @@
+"""
+Бенчмарк времени импорта модулей на основе `python -X importtime`.
+
+Импорт каждого модуля выполняется в отдельном процессе (несколько повторов, берётся медиана). Скрипт
+завершается с ненулевым кодом, если время импорта превышает бюджет или при импорте загружаются
+запрещенные тяжелые пакеты - это позволяет использовать его как регрессионную проверку.
+
+Пример запуска:
+    python -m tools.benchmark_import_time --budget-ms 300
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+
+DEFAULT_MODULES = [
+    "tools.anime_data_parsing",
+    "tools.merge_annotation_shards",
+]
+# Пакеты, которые не должны загружаться при импорте точек входа (загружаются только на своём этапе)
+DEFAULT_FORBIDDEN = [
+    "accelerate",
+    "torch",
+    "hydra",
+    "gql",
+    "graphql",
+    "requests",
+    "anime_parsers_ru",
+    "lxml",
+]
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    """
+    Разбор вывода `-X importtime`.
+
+    Returns:
+        (dict[str, tuple[int, int]]): Собственное и суммарное время импорта (в мкс) для каждого модуля
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Заголовок таблицы
+        if not self_us.strip().isdigit():
+            continue
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure_import(module: str, python: str = sys.executable) -> dict[str, tuple[int, int]]:
+    """ Импорт модуля в отдельном процессе с замером времени """
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Cannot import '{module}':\n{result.stderr}")
+    return parse_importtime(result.stderr)
+
+
+def benchmark_module(module: str, repeats: int = 5, top: int = 10, forbidden: list[str] | None = None) -> dict:
+    runs = [measure_import(module) for _ in range(repeats)]
+    # Время импорта самого модуля включает время импорта всех его зависимостей
+    total_ms = statistics.median(run[module][1] for run in runs) / 1000
+    last_run = runs[-1]
+    heaviest = sorted(last_run.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    loaded_forbidden = sorted({
+        name.split(".")[0] for name in last_run
+        if name.split(".")[0] in (forbidden or [])
+    })
+    return {
+        "module": module,
+        "total_ms": total_ms,
+        "modules_loaded": len(last_run),
+        "heaviest_self_ms": {name: self_us / 1000 for name, (self_us, _) in heaviest},
+        "forbidden_loaded": loaded_forbidden,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time regression benchmark (python -X importtime)")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to import")
+    parser.add_argument("--budget-ms", type=float, default=300, help="Max import time of each module")
+    parser.add_argument("--repeats", type=int, default=5, help="Number of imports (median is used)")
+    parser.add_argument("--top", type=int, default=10, help="Number of heaviest modules in report")
+    parser.add_argument(
+        "--forbid", default=",".join(DEFAULT_FORBIDDEN),
+        help="Comma separated packages which must not be loaded on import"
+    )
+    parser.add_argument("--output", default=None, help="Path to save JSON report (default - stdout)")
+    args = parser.parse_args()
+
+    forbidden = [name for name in args.forbid.split(",") if name]
+    report = {
+        "budget_ms": args.budget_ms,
+        "python": sys.version.split()[0],
+        "results": [
+            benchmark_module(module, repeats=args.repeats, top=args.top, forbidden=forbidden)
+            for module in args.modules
+        ],
+    }
+    failures = []
+    for result in report["results"]:
+        if result["total_ms"] > args.budget_ms:
+            failures.append(f"{result['module']}: {result['total_ms']:.1f} ms > {args.budget_ms:.1f} ms budget")
+        if result["forbidden_loaded"]:
+            failures.append(f"{result['module']}: loads {', '.join(result['forbidden_loaded'])}")
+    report["failures"] = failures
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=4), encoding="utf-8")
+    else:
+        json.dump(report, sys.stdout, indent=4)
+        print()
+    for failure in failures:
+        print("FAIL:", failure, file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
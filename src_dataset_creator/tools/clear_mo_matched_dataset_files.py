@@ -1,26 +1,281 @@
+"""
+Очистка набора данных от неиспользуемых файлов.
+
+Удаляются видео, не упомянутые ни в одной аннотации набора данных (`annotation.json` и части
+`annotation.<worker_id>.json` распределенного сбора), и временные директории сегментов `<tmp_root>/<hash>~`,
+оставшиеся после прерванных загрузок `KodikFastDownloader`. Для оставшихся видео сохраняется манифест
+контрольных сумм (sha256), при повторном запуске пересчитываются суммы только изменённых файлов.
+
+Режимы:
+    --dry-run - только вывести список файлов и объём освобождаемого места
+    --yes - удалить без подтверждения (по умолчанию запрашивается одно подтверждение на весь список)
+    --min-age - не трогать файлы, изменённые менее указанного количества часов назад (к прим. идущие загрузки)
+    --verify - только проверить видео по манифесту контрольных сумм (ненулевой код завершения при несовпадениях)
+
+Пример запуска:
+    python -m tools.clear_mo_matched_dataset_files --save-root dataset/anime_dataset --tmp-root tmp --dry-run
+"""
+import argparse
+import concurrent.futures
+import hashlib
 import json
+import os
+import shutil
+import sys
+import time
+from dataclasses import dataclass
 from pathlib import Path
+from stat import S_ISDIR
 
 ROOT = Path(__file__).parents[1]
 
 
+@dataclass
+class GarbageItem:
+    """ Удаляемый файл или директория """
+    path: Path
+    size: int
+    """ Размер в байтах (для директории - суммарный размер файлов) """
+    mtime: float
+    """ Время последнего изменения (для директории - самого нового файла) """
+    reason: str
+
+
+def _scan_path(path: Path) -> tuple[int, float] | None:
+    """
+    Размер и время последнего изменения файла или директории (по всем вложенным файлам).
+    Работающий сборщик данных может удалять временные файлы во время сканирования - исчезнувшие файлы пропускаются
+
+    Returns:
+        (tuple[int, float] | None): Размер и время изменения (None - путь удалён во время сканирования)
+    """
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    if not S_ISDIR(stat.st_mode):
+        return stat.st_size, stat.st_mtime
+    size, mtime = 0, stat.st_mtime
+    # os.walk пропускает директории, удалённые до их обхода
+    for directory, dir_names, file_names in os.walk(path):
+        for name in dir_names + file_names:
+            try:
+                entry_stat = os.stat(os.path.join(directory, name))
+            except FileNotFoundError:
+                continue
+            mtime = max(mtime, entry_stat.st_mtime)
+            if not S_ISDIR(entry_stat.st_mode):
+                size += entry_stat.st_size
+    return size, mtime
+
+
+def load_selected_videos(save_root: Path) -> set[Path]:
+    """
+    Пути видео (относительно набора данных), упомянутые в аннотации или её частях.
+
+    Отсутствие аннотаций или пустая аннотация (к прим. ошибка в пути или аннотация в процессе замены)
+    считаются ошибкой - иначе все видео набора данных были бы признаны неиспользуемыми.
+    """
+    # Временные файлы (с "~" в имени) не учитываются
+    annotation_paths = [path for path in save_root.glob("annotation*.json") if not path.stem.endswith("~")]
+    if not annotation_paths:
+        raise FileNotFoundError(f"No found annotation files at '{save_root}'")
+    selected_videos = set()
+    for annotation_path in annotation_paths:
+        with open(annotation_path, "r", encoding="utf-8") as f:
+            anime_dataset = json.load(f)
+        if not anime_dataset["animes"]:
+            raise ValueError(f"Annotation '{annotation_path}' has no videos")
+        selected_videos.update(Path(data["video_path"]) for data in anime_dataset["animes"])
+    return selected_videos
+
+
+def find_garbage(
+        save_root: Path,
+        tmp_root: Path | None = None,
+        min_age: float = 0.0,
+        num_workers: int = 8,
+) -> tuple[list[GarbageItem], list[Path]]:
+    """
+    Поиск неиспользуемых файлов.
+
+    Args:
+        save_root (Path): Путь до набора данных
+        tmp_root (Path | None): Директория временных файлов загрузчика (None - не очищать)
+        min_age (float): Минимальное время с последнего изменения (в часах) удаляемых файлов
+        num_workers (int): Количество потоков сканирования файловой системы
+
+    Returns:
+        (tuple[list[GarbageItem], list[Path]]): Удаляемые файлы и сохраняемые видео
+    """
+    selected_videos = load_selected_videos(save_root)
+    candidates: dict[Path, str] = {}
+    kept_videos = []
+    for path in save_root.glob("videos/*/*.mp4"):
+        if path.relative_to(save_root) in selected_videos:
+            kept_videos.append(path)
+        else:
+            candidates[path] = "not in annotation"
+            # Описание сегментов частичной загрузки удаляется вместе с видео
+            segments_path = path.with_suffix(".segments.json")
+            if segments_path.exists():
+                candidates[segments_path] = "not in annotation"
+    # Незавершенные загрузки хранятся в директориях с "~" в конце имени (прочие директории - к прим. кеш схемы API)
+    if tmp_root is not None and tmp_root.exists():
+        for path in tmp_root.glob("*~"):
+            if path.is_dir():
+                candidates[path] = "stale download segments"
+
+    garbage = []
+    max_mtime = time.time() - min_age * 3600
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for path, scan in zip(candidates, executor.map(_scan_path, candidates)):
+            if scan is None:
+                continue
+            size, mtime = scan
+            if mtime <= max_mtime:
+                garbage.append(GarbageItem(path=path, size=size, mtime=mtime, reason=candidates[path]))
+    return garbage, kept_videos
+
+
+def _sha256(path: Path, chunk_size: int = 2 ** 20) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def update_checksum_manifest(
+        save_root: Path,
+        videos: list[Path],
+        manifest_path: Path,
+        num_workers: int = 8,
+) -> tuple[dict[str, dict], int]:
+    """
+    Обновление манифеста контрольных сумм видео. Суммы пересчитываются только для новых файлов
+    и файлов с изменившимся размером или временем изменения.
+
+    Returns:
+        (tuple[dict[str, dict], int]): Манифест и количество пересчитанных сумм
+    """
+    manifest = {}
+    if manifest_path.exists():
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    new_manifest = {}
+    to_hash = []
+    for path in videos:
+        key = path.relative_to(save_root).as_posix()
+        stat = path.stat()
+        entry = manifest.get(key)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            new_manifest[key] = entry
+        else:
+            new_manifest[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            to_hash.append((key, path))
+    # hashlib освобождает GIL при хешировании - достаточно потоков
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for (key, _), checksum in zip(to_hash, executor.map(_sha256, [path for _, path in to_hash])):
+            new_manifest[key]["sha256"] = checksum
+    new_manifest = {key: new_manifest[key] for key in sorted(new_manifest)}
+
+    # Сохраним данные во временный json и заменим им исходный
+    tmp_path = manifest_path.with_stem(f"{manifest_path.stem}~")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(new_manifest, f, indent=4)
+    manifest_path.unlink(missing_ok=True)
+    tmp_path.rename(manifest_path)
+
+    return new_manifest, len(to_hash)
+
+
+def verify_checksum_manifest(
+        save_root: Path,
+        manifest_path: Path,
+        num_workers: int = 8,
+) -> list[tuple[str, str]]:
+    """
+    Проверка видео по манифесту контрольных сумм (суммы пересчитываются для всех файлов).
+
+    Returns:
+        (list[tuple[str, str]]): Несовпадения: путь видео и причина
+    """
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    mismatches = []
+    to_hash = []
+    for key, entry in manifest.items():
+        path = save_root / key
+        if not path.exists():
+            mismatches.append((key, "missing"))
+        elif path.stat().st_size != entry["size"]:
+            mismatches.append((key, "size mismatch"))
+        else:
+            to_hash.append((key, path))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for (key, _), checksum in zip(to_hash, executor.map(_sha256, [path for _, path in to_hash])):
+            if checksum != manifest[key]["sha256"]:
+                mismatches.append((key, "checksum mismatch"))
+    return sorted(mismatches)
+
+
+def remove_garbage(garbage: list[GarbageItem], save_root: Path):
+    for item in garbage:
+        if item.path.is_dir():
+            shutil.rmtree(item.path, ignore_errors=True)
+        else:
+            item.path.unlink(missing_ok=True)
+    # Удалим опустевшие директории видео
+    for video_dir in (save_root / "videos").glob("*"):
+        if video_dir.is_dir() and not any(video_dir.iterdir()):
+            video_dir.rmdir()
+
+
 if __name__ == "__main__":
-    dataset_path = Path(ROOT, "dataset", "AnimeSeriesCaptionDataset_t615")
-    annotation_path = dataset_path / "annotation.json"
-    videos_dir = dataset_path / "videos"
+    parser = argparse.ArgumentParser(description="Remove unused videos and stale download segments of the dataset")
+    parser.add_argument("--save-root", default=Path(ROOT, "dataset", "anime_dataset"), help="Dataset root")
+    parser.add_argument("--tmp-root", default=Path(ROOT, "tmp"), help="Downloader tmp root (empty - skip)")
+    parser.add_argument("--min-age", type=float, default=24, help="Keep files modified within this many hours")
+    parser.add_argument("--num-workers", type=int, default=8, help="Number of scanning and hashing threads")
+    parser.add_argument("--dry-run", action="store_true", help="Only report files to delete")
+    parser.add_argument("--yes", action="store_true", help="Delete without confirmation")
+    parser.add_argument("--verify", action="store_true", help="Only verify kept videos against checksum manifest")
+    parser.add_argument(
+        "--manifest", default="checksums.json",
+        help="Checksum manifest of kept videos relative to dataset root (empty - skip)"
+    )
+    args = parser.parse_args()
+
+    save_root = Path(args.save_root)
+    if args.verify:
+        mismatches = verify_checksum_manifest(save_root, save_root / args.manifest, num_workers=args.num_workers)
+        for key, reason in mismatches:
+            print(f"{reason:20}  {key}")
+        print(f"Checksum mismatches: {len(mismatches)}")
+        sys.exit(1 if mismatches else 0)
 
-    # Загрузим из него данные
-    with open(annotation_path, "r", encoding="utf-8") as f:
-        anime_dataset = json.load(f)
+    tmp_root = Path(args.tmp_root) if args.tmp_root else None
+    garbage, kept_videos = find_garbage(save_root, tmp_root, min_age=args.min_age, num_workers=args.num_workers)
 
-    selected_videos = set(Path(data['video_path']) for data in  anime_dataset["animes"])
-    print(f"Selected videos: {len(selected_videos)}")
+    for item in sorted(garbage, key=lambda item: item.path):
+        print(f"{item.size / 2 ** 20:10.1f} MB  {item.reason:24}  {item.path}")
+    reclaimable = sum(item.size for item in garbage)
+    print(f"Kept videos: {len(kept_videos)}")
+    print(f"Items to delete: {len(garbage)}, reclaimable: {reclaimable / 2 ** 30:.2f} GB")
 
-    video_paths: list[Path] = list(videos_dir.glob("*/*.mp4"))
-    video_to_delete = [p for p in video_paths if p.relative_to(dataset_path) not in selected_videos]
-    print(f"Videos to delete: {len(video_to_delete)}")
+    if garbage and not args.dry_run:
+        if args.yes or input(f"Delete {len(garbage)} items? [y/N] ").lower() == "y":
+            remove_garbage(garbage, save_root)
+            print("Deleted.")
 
-    for path in video_to_delete:
-        res = input(f"Are you sure to delete {path.relative_to(dataset_path)}? [y/N] ")
-        if res.lower() == "y":
-            path.unlink()
+    if args.manifest and not args.dry_run:
+        _, rehashed = update_checksum_manifest(
+            save_root,
+            kept_videos,
+            save_root / args.manifest,
+            num_workers=args.num_workers
+        )
+        print(f"Checksum manifest updated: {save_root / args.manifest} (rehashed: {rehashed})")
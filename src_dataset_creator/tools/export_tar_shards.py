@@ -0,0 +1,203 @@
+"""
+Экспорт набора данных в tar шарды фиксированного размера (формат WebDataset) для последовательного чтения при обучении.
+
+Каждый пример записывается в шард как группа файлов с общим ключом (id аниме):
+    <id>.json - запись аннотации
+    <id>.mp4 - видео (режим `video`)
+    <id>.000.jpg, <id>.001.jpg, ... - извлеченные кадры (режим `frames`)
+
+Кадры извлекаются в моменты `frame_timestamps` из аннотации, а при их отсутствии - равномерно по видео.
+Рядом с шардами сохраняется индекс `shards.json` с количеством примеров и размером каждого шарда.
+
+Пример запуска:
+    python -m tools.export_tar_shards --save-root dataset/anime_dataset --output-dir dataset/anime_shards --mode frames
+"""
+import argparse
+import collections
+import concurrent.futures
+import io
+import json
+import subprocess
+import tarfile
+import time
+from pathlib import Path
+
+from core.video_metadata_index import probe_video
+
+ROOT = Path(__file__).parents[1]
+
+
+def extract_frames(
+        video_path: Path,
+        timestamps: list[float] | None = None,
+        num_frames: int = 32,
+        quality: int = 3,
+        ffmpeg: str = "ffmpeg",
+) -> list[bytes]:
+    """
+    Извлечение кадров видео в формате JPEG.
+
+    Args:
+        video_path (Path): Путь до видео
+        timestamps (list[float] | None): Моменты времени кадров в секундах (None - `num_frames` равномерно по видео)
+        num_frames (int): Количество равномерно распределенных кадров
+        quality (int): Качество JPEG (2 - лучшее, 31 - худшее)
+        ffmpeg (str): Путь до исполняемого файла ffmpeg
+
+    Returns:
+        (list[bytes]): Кадры в формате JPEG
+    """
+    if timestamps is None:
+        duration = probe_video(video_path)["duration"]
+        timestamps = [(i + 0.5) * duration / num_frames for i in range(num_frames)]
+    frames = []
+    for timestamp in timestamps:
+        # Быстрый переход к ближайшему ключевому кадру (-ss перед -i) с точным декодированием до нужного момента
+        result = subprocess.run(
+            [
+                ffmpeg, "-v", "error", "-nostdin",
+                "-ss", f"{timestamp:.3f}", "-i", str(video_path),
+                "-frames:v", "1", "-q:v", str(quality),
+                "-f", "image2pipe", "-c:v", "mjpeg", "-",
+            ],
+            capture_output=True,
+            check=True,
+        )
+        if not result.stdout:
+            raise RuntimeError(f"No found frame at {timestamp} sec in '{video_path}'")
+        frames.append(result.stdout)
+    return frames
+
+
+def _sample_files(save_root: Path, anime: dict, mode: str, num_frames: int, ffmpeg: str) -> dict[str, bytes]:
+    """ Файлы примера вида: расширение -> содержимое """
+    video_path = save_root / anime["video_path"]
+    files = {"json": json.dumps(anime, ensure_ascii=False).encode("utf-8")}
+    if mode == "video":
+        files["mp4"] = video_path.read_bytes()
+    else:
+        frames = extract_frames(video_path, anime.get("frame_timestamps"), num_frames=num_frames, ffmpeg=ffmpeg)
+        for i, frame in enumerate(frames):
+            files[f"{i:03d}.jpg"] = frame
+    return files
+
+
+class TarShardWriter:
+    """ Запись примеров в последовательность tar шардов ограниченного размера """
+    def __init__(self, output_dir: Path, max_shard_size: int, max_shard_samples: int | None = None):
+        self.output_dir = output_dir
+        self.max_shard_size = max_shard_size
+        self.max_shard_samples = max_shard_samples
+        self.shards: list[dict] = []
+        self._tar: tarfile.TarFile | None = None
+
+    def _open_shard(self):
+        name = f"shard-{len(self.shards):06d}.tar"
+        self._tar = tarfile.open(self.output_dir / name, "w")
+        self.shards.append({"name": name, "samples": 0, "size": 0})
+
+    def write(self, key: str, files: dict[str, bytes]):
+        sample_size = sum(len(data) for data in files.values())
+        shard = self.shards[-1] if self.shards else None
+        # Начнем новый шард, если текущий переполнится (пример целиком остается в одном шарде)
+        if (shard is None
+                or (shard["samples"] > 0 and shard["size"] + sample_size > self.max_shard_size)
+                or (self.max_shard_samples is not None and shard["samples"] >= self.max_shard_samples)):
+            self.close()
+            self._open_shard()
+            shard = self.shards[-1]
+        mtime = time.time()
+        for extension, data in files.items():
+            info = tarfile.TarInfo(f"{key}.{extension}")
+            info.size = len(data)
+            info.mtime = mtime
+            self._tar.addfile(info, io.BytesIO(data))
+        shard["samples"] += 1
+        shard["size"] += sample_size
+
+    def close(self):
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+
+
+def export_tar_shards(
+        save_root: str | Path,
+        output_dir: str | Path,
+        mode: str = "frames",
+        num_frames: int = 32,
+        shard_size_mb: float = 1024,
+        max_shard_samples: int | None = None,
+        num_workers: int = 8,
+        ffmpeg: str = "ffmpeg",
+) -> list[dict]:
+    """
+    Экспорт набора данных в tar шарды.
+
+    Args:
+        save_root (str | Path): Путь до набора данных
+        output_dir (str | Path): Директория сохранения шардов
+        mode (str): Содержимое примеров: "video" - исходное видео, "frames" - извлеченные JPEG кадры
+        num_frames (int): Количество равномерно распределенных кадров для аниме без `frame_timestamps`
+        shard_size_mb (float): Максимальный размер шарда в МБ
+        max_shard_samples (int | None): Максимальное количество примеров в шарде (None - без ограничения)
+        num_workers (int): Количество потоков подготовки примеров
+        ffmpeg (str): Путь до исполняемого файла ffmpeg
+
+    Returns:
+        (list[dict]): Индекс шардов (имя, количество примеров, размер)
+    """
+    save_root, output_dir = Path(save_root), Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(save_root / "annotation.json", "r", encoding="utf-8") as f:
+        animes = json.load(f)["animes"]
+
+    writer = TarShardWriter(output_dir, int(shard_size_mb * 2 ** 20), max_shard_samples)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+            # Примеры готовятся параллельно, а записываются в порядке аннотации.
+            # В работе держится не более 2 * num_workers примеров, чтобы подготовленные, но ещё не записанные
+            # примеры не накапливались в памяти
+            pending: collections.deque[tuple[dict, concurrent.futures.Future]] = collections.deque()
+            for anime in animes:
+                if len(pending) >= 2 * num_workers:
+                    done_anime, future = pending.popleft()
+                    writer.write(str(done_anime["id"]), future.result())
+                pending.append(
+                    (anime, executor.submit(_sample_files, save_root, anime, mode, num_frames, ffmpeg))
+                )
+            while pending:
+                done_anime, future = pending.popleft()
+                writer.write(str(done_anime["id"]), future.result())
+    finally:
+        writer.close()
+
+    index = {"mode": mode, "samples": len(animes), "shards": writer.shards}
+    with open(output_dir / "shards.json", "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=4)
+    return writer.shards
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export dataset to WebDataset-style tar shards")
+    parser.add_argument("--save-root", default=Path(ROOT, "dataset", "anime_dataset"), help="Dataset root")
+    parser.add_argument("--output-dir", default=Path(ROOT, "dataset", "anime_shards"), help="Shards directory")
+    parser.add_argument("--mode", choices=["frames", "video"], default="frames", help="Sample content")
+    parser.add_argument("--num-frames", type=int, default=32, help="Uniform frames for samples without timestamps")
+    parser.add_argument("--shard-size-mb", type=float, default=1024, help="Max shard size in MB")
+    parser.add_argument("--max-shard-samples", type=int, default=None, help="Max samples per shard")
+    parser.add_argument("--num-workers", type=int, default=8, help="Number of sample preparing threads")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="Path to ffmpeg executable")
+    args = parser.parse_args()
+
+    shards = export_tar_shards(
+        args.save_root,
+        args.output_dir,
+        mode=args.mode,
+        num_frames=args.num_frames,
+        shard_size_mb=args.shard_size_mb,
+        max_shard_samples=args.max_shard_samples,
+        num_workers=args.num_workers,
+        ffmpeg=args.ffmpeg,
+    )
+    print(f"Exported {sum(shard['samples'] for shard in shards)} samples to {len(shards)} shards")
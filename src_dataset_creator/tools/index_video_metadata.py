@@ -0,0 +1,48 @@
+"""
+Индексация метаданных скачанных видео (длительность, количество кадров, разрешение, размер) с помощью ffprobe.
+
+Индекс сохраняется в `<save_root>/video_metadata.json`, при повторном запуске обрабатываются только
+новые и изменённые видео. Дополнительно выводятся повреждённые видео и аниме из аннотации без валидного видео.
+
+Пример запуска:
+    python -m tools.index_video_metadata --save-root dataset/anime_dataset --num-workers 8
+"""
+import argparse
+import json
+from pathlib import Path
+
+from core.video_metadata_index import VideoMetadataIndex
+
+ROOT = Path(__file__).parents[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build ffprobe metadata index of downloaded videos")
+    parser.add_argument("--save-root", default=Path(ROOT, "dataset", "anime_dataset"), help="Dataset root")
+    parser.add_argument("--num-workers", type=int, default=None, help="Number of ffprobe processes")
+    parser.add_argument("--ffprobe", default="ffprobe", help="Path to ffprobe executable")
+    parser.add_argument("--count-frames", action="store_true", help="Count video packets if container has no frame count")
+    parser.add_argument("--min-duration", type=float, default=0.0, help="Videos shorter than this are reported (sec)")
+    args = parser.parse_args()
+
+    save_root = Path(args.save_root)
+    index = VideoMetadataIndex(save_root)
+    probed, removed = index.update(num_workers=args.num_workers, ffprobe=args.ffprobe, count_frames=args.count_frames)
+    print(f"Indexed videos: {len(index)} (probed: {probed}, removed: {removed})")
+
+    invalid = index.invalid(min_duration=args.min_duration)
+    for video_path, entry in sorted(invalid.items()):
+        print(f"Invalid video {video_path}: {entry['error'] or entry.get('warnings') or 'no frames or too short'}")
+    print(f"Invalid videos: {len(invalid)}")
+
+    annotation_path = save_root / "annotation.json"
+    if annotation_path.exists():
+        with open(annotation_path, "r", encoding="utf-8") as f:
+            anime_dataset = json.load(f)
+        missing = [
+            data for data in anime_dataset["animes"]
+            if index.get(data["video_path"]) is None or Path(data["video_path"]).as_posix() in invalid
+        ]
+        for data in missing:
+            print(f"Annotation entry without valid video: {data['name']} (id {data['id']})")
+        print(f"Annotation entries without valid video: {len(missing)} of {len(anime_dataset['animes'])}")
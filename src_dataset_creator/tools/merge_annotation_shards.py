@@ -0,0 +1,63 @@
+import argparse
+import datetime
+import json
+from pathlib import Path
+
+ROOT = Path(__file__).parents[1]
+
+
+def merge_annotation_shards(save_root: str | Path) -> dict:
+    """
+    Объединение частей аннотации, собранных несколькими обработчиками (`annotation.<worker_id>.json`),
+    с уже существующей аннотацией `annotation.json`. Повторяющиеся по `id` аниме сохраняются один раз.
+
+    Args:
+        save_root (str | Path): Путь до набора данных
+
+    Returns:
+        (dict): Объединенная аннотация
+    """
+    save_root = Path(save_root)
+    annotation_path = save_root / "annotation.json"
+    # Временные файлы частей (с "~" в имени) не учитываются
+    shard_paths = sorted(path for path in save_root.glob("annotation.*.json") if not path.stem.endswith("~"))
+    if annotation_path.exists():
+        shard_paths.insert(0, annotation_path)
+    if not shard_paths:
+        raise FileNotFoundError(f"No found annotation shards in '{save_root}'")
+
+    anime_dataset = {
+        "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "language": "en",
+        "animes": []
+    }
+    anime_ids: set[str] = set()
+    for shard_path in shard_paths:
+        with open(shard_path, "r", encoding="utf-8") as f:
+            shard = json.load(f)
+        # Сохраним самую раннюю дату создания
+        anime_dataset["created_at"] = min(anime_dataset["created_at"], shard["created_at"])
+        for anime in shard["animes"]:
+            if str(anime["id"]) in anime_ids:
+                continue
+            anime_ids.add(str(anime["id"]))
+            anime_dataset["animes"].append(anime)
+    anime_dataset["updated_at"] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    # Сохраним данные во временный json и заменим им исходный
+    tmp_annotation_path = annotation_path.with_stem(f"{annotation_path.stem}~")
+    with open(tmp_annotation_path, "w") as f:
+        json.dump(anime_dataset, f, indent=4)
+    annotation_path.unlink(missing_ok=True)
+    tmp_annotation_path.rename(annotation_path)
+
+    return anime_dataset
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge annotation shards of distributed crawling")
+    parser.add_argument("--save-root", default=Path(ROOT, "dataset", "anime_dataset"), help="Dataset root")
+    args = parser.parse_args()
+
+    merged = merge_annotation_shards(args.save_root)
+    print(f"Merged animes: {len(merged['animes'])}")